@@ -5,12 +5,11 @@ import yaml
 from app.configuration.log import get_logger
 from app.loader import start_app
 
-LOGGER = get_logger(__name__, 'logs')
+LOGGER = get_logger(__name__)
 
 
 def main():
     try:
-        LOGGER.info("start application")
         asyncio.run(start_app())
     except (
             RuntimeError,
@@ -0,0 +1,208 @@
+import datetime
+import glob
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import os
+import queue
+import threading
+import time
+from typing import (
+    Any, Awaitable, Callable, Dict, Iterable, Iterator, Union
+)
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+CAPTURE_FILE_FORMAT = 'updates-{time}.jsonl.gz'
+CAPTURE_FILE_PATTERN = 'updates-*.jsonl.gz'
+CAPTURE_TIME_FORMAT = '%Y%m%d-%H%M%S-%f'
+HASH_PREFIX = '#'
+
+
+class FieldHasher:
+    """Replaces the values of sensitive fields with keyed hashes.
+
+    The same value always gets the same hash within a salt, so replayed
+    traffic keeps its shape (repeated texts, the same user names) without
+    the content. A leading bot command of a text is kept, so commands
+    are routed to the same handlers on replay.
+
+    Numbers keep their type and sign: ids become other stable ids (a
+    private chat and its user still share one), so replay can route by
+    them. Ids in ``kept_ids`` (the bots and their admin chats) are left
+    as they are to stay recognisable. Values that can't be hashed are
+    dropped rather than written in clear.
+    """
+
+    def __init__(self, fields: list[str], salt: bytes,
+                 kept_ids: Iterable[int] = ()) -> None:
+        self.fields = frozenset(fields)
+        self.salt = salt
+        self.kept_ids = frozenset(kept_ids)
+
+    def hash(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if value.startswith('/'):
+                command, _, rest = value.partition(' ')
+                return f'{command} {self.digest(rest)}' if rest else command
+            return self.digest(value)
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, int):
+            if value in self.kept_ids:
+                return value
+            return self.number(str(value)) * (-1 if value < 0 else 1)
+        if isinstance(value, float):
+            return math.copysign(self.number(repr(value)) % 10 ** 6 / 1e4,
+                                 value)
+        return None
+
+    def digest(self, value: str) -> str:
+        return HASH_PREFIX + self.__mac(value).hex()[:16]
+
+    def number(self, value: str) -> int:
+        """A positive integer below 2 ** 48 keyed by ``value``."""
+        return int.from_bytes(self.__mac(value)[:6], 'big') or 1
+
+    def __mac(self, value: str) -> bytes:
+        return hmac.new(self.salt, value.encode(), hashlib.sha256).digest()
+
+    def apply(self, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {
+                key: self.hash(value) if key in self.fields
+                and not isinstance(value, (dict, list))
+                else self.apply(value)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [self.apply(item) for item in data]
+        return data
+
+
+class UpdateCapture(BaseMiddleware):
+    """Records incoming updates for later replay.
+
+    The middleware only queues the update with its bot id and receive
+    time; a writer thread hashes the sensitive fields and appends one
+    JSON line per update to a gzip file under ``path``. A file is
+    closed and a new one started after ``max_bytes`` of uncompressed
+    data, and only the newest ``backup_count`` files are kept. Written
+    data is flushed every ``flush_interval`` seconds, so a crash loses
+    at most that much.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        self.__queue.put((time.time(), data['bot'].id, event))
+        return await handler(event, data)
+
+    def __init__(self, settings: Config.Capture, salt: bytes,
+                 kept_ids: Iterable[int] = ()) -> None:
+        self.settings = settings
+        self.hasher = FieldHasher(settings.hashed_fields, salt, kept_ids)
+        self.captured = 0
+        self.__queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.__thread: Union[None, threading.Thread] = None
+        self.__file: Union[None, gzip.GzipFile] = None
+        self.__written = 0
+
+    def start(self) -> None:
+        os.makedirs(self.settings.path, exist_ok=True)
+        self.__thread = threading.Thread(target=self.__write,
+                                         name='update-capture', daemon=True)
+        self.__thread.start()
+        LOGGER.info('capturing updates to "%s"', self.settings.path)
+
+    def stop(self) -> None:
+        """Writes the queued updates and closes the file."""
+        if self.__thread:
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__thread = None
+
+    def __write(self) -> None:
+        flushed_at = time.monotonic()
+        while True:
+            try:
+                record = self.__queue.get(
+                    timeout=self.settings.flush_interval)
+            except queue.Empty:
+                record = False
+            if record is None:
+                break
+            if record:
+                try:
+                    self.__append(*record)
+                except Exception as exc:  # pylint: disable=broad-except
+                    LOGGER.error('update not captured: %s', exc)
+            if self.__file and \
+                    time.monotonic() - flushed_at >= \
+                    self.settings.flush_interval:
+                self.__file.flush()
+                flushed_at = time.monotonic()
+        if self.__file:
+            self.__file.close()
+            self.__file = None
+
+    def __append(self, received_at: float, bot_id: int,
+                 update: Update) -> None:
+        line = json.dumps({
+            'time': received_at,
+            'bot': bot_id,
+            'update': self.hasher.apply(
+                update.model_dump(mode='json', exclude_none=True,
+                                  by_alias=True))
+        }, ensure_ascii=False).encode() + b'\n'
+        if self.__file is None or self.__written >= self.settings.max_bytes:
+            self.__rotate()
+        self.__file.write(line)
+        self.__written += len(line)
+        self.captured += 1
+
+    def __rotate(self) -> None:
+        if self.__file:
+            self.__file.close()
+        name = CAPTURE_FILE_FORMAT.format(
+            time=datetime.datetime.now(datetime.timezone.utc).strftime(
+                CAPTURE_TIME_FORMAT))
+        self.__file = gzip.open(os.path.join(self.settings.path, name), 'ab')
+        self.__written = 0
+        if self.settings.backup_count:
+            for old in capture_files(self.settings.path)[
+                    :-self.settings.backup_count]:
+                os.remove(old)
+
+
+def capture_files(path: str) -> list[str]:
+    """Capture files under ``path`` (or ``path`` itself), oldest first."""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, CAPTURE_FILE_PATTERN)))
+
+
+def read_capture(path: str) -> Iterator[dict]:
+    """Records of all capture files in order; a file cut short by a crash
+    is read up to the last complete line.
+    """
+    for filename in capture_files(path):
+        with gzip.open(filename, 'rb') as file:
+            try:
+                for line in file:
+                    if line.endswith(b'\n'):
+                        yield json.loads(line)
+            except (EOFError, gzip.BadGzipFile) as exc:
+                LOGGER.warning('capture file "%s" is truncated: %s',
+                               filename, exc)
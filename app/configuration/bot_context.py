@@ -0,0 +1,86 @@
+import asyncio
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from aiogram import Bot
+from aiogram.types import User
+
+from app.configuration.config_loader import CONFIG, Config
+from app.services.user_service import UserService
+
+BOT_PUBLIC_URL_FORMAT = 'https://t.me/{bot_username}'
+
+
+class BotContext:
+    """Immutable per-bot runtime data resolved once at startup.
+
+    Handlers receive it as ``bot_context`` instead of calling
+    ``bot.get_me()`` or indexing ``CONFIG.bots`` on every update.
+    """
+    __slots__ = (
+        'id',
+        'username',
+        'url',
+        'owner_id',
+        'admin_chat_id',
+        'thread_id',
+        'channel_id',
+        'user_service'
+    )
+
+    id: int
+    username: str
+    url: str
+    owner_id: int
+    admin_chat_id: int
+    thread_id: int
+    channel_id: int
+    user_service: UserService
+
+    def __init__(
+            self,
+            bot_user: User,
+            bot_config: Config.Bot,
+            user_service: UserService
+    ) -> None:
+        values = {
+            'id': bot_user.id,
+            'username': bot_user.username,
+            'url': BOT_PUBLIC_URL_FORMAT.format(bot_username=bot_user.username),
+            'owner_id': bot_config.owner_id,
+            'admin_chat_id': bot_config.admin_chat_id,
+            'thread_id': bot_config.thread_id,
+            'channel_id': bot_config.channel_id,
+            'user_service': user_service
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.id}, username={self.username})'
+
+
+async def build_bot_contexts(
+        bots: list[Bot],
+        user_service: UserService
+) -> Mapping[int, BotContext]:
+    """Resolves identities of all bots concurrently and builds
+    the read-only registry of their contexts keyed by bot id.
+
+    ``bot.me()`` keeps the identity on the bot, so later calls (owner
+    notifications, polling start-up) need no ``getMe`` round trip.
+    """
+    bot_users = await asyncio.gather(*(bot.me() for bot in bots))
+    return MappingProxyType({
+        bot_user.id: BotContext(
+            bot_user=bot_user,
+            bot_config=CONFIG.bots[bot_user.id],
+            user_service=user_service
+        ) for bot_user in bot_users
+    })
@@ -0,0 +1,158 @@
+import asyncio
+import os
+from string import Formatter
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple, Union
+
+import yaml
+from aiogram.types import InlineKeyboardMarkup
+from pydantic import ValidationError
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+from app.keyboards.keyboard import get_keyboard_from_data
+
+LOGGER = get_logger(__name__)
+
+TEMPLATE_FIELDS = frozenset({'user_mention'})
+
+
+class Template:
+    """A ``str.format`` template split into literal and field parts once,
+    so rendering is a plain join.
+    """
+    __slots__ = ('source', 'parts')
+
+    def __init__(self, source: str) -> None:
+        if not isinstance(source, str):
+            raise ValueError(f'text must be a string, got {source!r}')
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                parts.append((literal, None))
+            if field is None:
+                continue
+            if field not in TEMPLATE_FIELDS or spec or conversion:
+                raise ValueError(f'unsupported placeholder {{{field}}} '
+                                 f'in {source!r}')
+            parts.append(('', field))
+        self.source = source
+        self.parts = tuple(parts)
+
+    def render(self, **values: str) -> str:
+        return ''.join(
+            values[field] if field else literal
+            for literal, field in self.parts
+        )
+
+
+class TimedText(NamedTuple):
+    text: str
+    ttl: int
+
+
+class BotData:
+    """Compiled ``bot_data.yaml`` entry of one bot.
+
+    Everything that used to be re-read from the raw dicts on every update
+    is prepared here once: templates are parsed, keyboards are built and
+    the whole entry is validated.
+    """
+    __slots__ = ('start_text', 'start_keyboard', 'start_after',
+                 'answer_message')
+
+    start_text: Union[None, Template]
+    start_keyboard: Union[None, InlineKeyboardMarkup]
+    start_after: tuple[TimedText, ...]
+    answer_message: Union[None, TimedText]
+
+    def __init__(self, raw: Mapping[str, Any]) -> None:
+        start_message = raw.get('start_message') or {}
+        answer_message = raw.get('answer_message')
+        buttons = start_message.get('buttons') or []
+        values = {
+            'start_text': Template(start_message['text'])
+            if start_message else None,
+            'start_keyboard': get_keyboard_from_data(buttons_data=buttons)
+            if any(buttons) else None,
+            'start_after': tuple(
+                TimedText(text=after['text'], ttl=int(after.get('ttl', 0)))
+                for after in start_message.get('after') or []
+            ),
+            'answer_message': TimedText(
+                text=answer_message['text'],
+                ttl=int(answer_message.get('ttl', 0))
+            ) if answer_message else None
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+
+EMPTY_BOT_DATA = BotData({})
+
+
+def compile_bot_data(raw: Any) -> Mapping[int, BotData]:
+    """Validates the whole file; raises ``ValueError`` naming the bot
+    whose entry is broken.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('bot data must be a mapping of bot ids')
+    snapshot = {}
+    for bot_id, entry in raw.items():
+        try:
+            snapshot[int(bot_id)] = BotData(entry or {})
+        except (AttributeError, KeyError, TypeError, ValueError,
+                ValidationError) as exc:
+            raise ValueError(f'bot {bot_id}: {exc!r}') from exc
+    return MappingProxyType(snapshot)
+
+
+class BotDataRegistry:
+    """Holds the current compiled snapshot of ``bot_data.yaml``.
+
+    ``watch`` polls the file's mtime and swaps in a freshly compiled
+    snapshot when it changes. A reference swap is atomic for the event
+    loop, so an update sees either the old or the new data, never a mix.
+    An invalid edit is logged and the previous snapshot stays active.
+    """
+
+    def __init__(self, settings: Config.BotData):
+        self.settings = settings
+        self.reloads = 0
+        self.__snapshot: Mapping[int, BotData] = MappingProxyType({})
+        self.__mtime = 0.0
+
+    def get(self, bot_id: int) -> BotData:
+        return self.__snapshot.get(bot_id, EMPTY_BOT_DATA)
+
+    def load(self) -> None:
+        """Reads and compiles the file, raising on invalid content."""
+        path = os.path.relpath(self.settings.path)
+        mtime = os.stat(path).st_mtime
+        with open(path, 'r', encoding='utf-8') as file:
+            snapshot = compile_bot_data(yaml.safe_load(file))
+        self.__snapshot, self.__mtime = snapshot, mtime
+        self.reloads += 1
+        LOGGER.info('bot data loaded from "%s" for bots %s',
+                    path, list(snapshot))
+
+    async def watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.reload_interval)
+            try:
+                mtime = os.stat(self.settings.path).st_mtime
+            except OSError as exc:
+                LOGGER.error('bot data file is not available: %s', exc)
+                continue
+            if mtime == self.__mtime:
+                continue
+            try:
+                self.load()
+            except (OSError, yaml.YAMLError, ValueError) as exc:
+                LOGGER.error('bot data not reloaded, keeping the previous '
+                             'version: %s', exc)
+                # don't retry the same broken file until it changes again
+                self.__mtime = mtime
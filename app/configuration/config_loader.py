@@ -1,5 +1,7 @@
+import functools
 import os
 from dataclasses import dataclass
+from typing import Any, Union
 
 import dotenv
 import yaml
@@ -7,7 +9,7 @@ import yaml
 from app.configuration.log import get_logger
 from app.halpers.decorators import singleton
 
-LOGGER = get_logger(__name__, '../../logs')
+LOGGER = get_logger(__name__)
 
 BOT_TOKEN_FORMAT = 'BOT_{}'
 
@@ -27,9 +29,11 @@ class Config:
     @dataclass
     class App:
         debug: bool
+        mode: str
 
-        def __init__(self, debug: bool = False) -> None:
+        def __init__(self, debug: bool = False, mode: str = 'polling') -> None:
             self.debug = debug
+            self.mode = mode
 
     @dataclass
     class Bot:
@@ -66,22 +70,378 @@ class Config:
         host: str
         port: int
         db: int
+        unix_socket: str
+        max_connections: int
+        fsm_max_connections: int
+        pool_timeout: float
+        socket_timeout: float
+        connect_timeout: float
+        health_check_interval: int
+        retries: int
+        retry_backoff: float
+        retry_backoff_cap: float
+        retry_on_timeout: bool
 
-        def __init__(self, db: int, host: str = '127.0.0.1',
-                     port: int = 6379) -> None:
+        def __init__(
+                self,
+                db: int,
+                host: str = '127.0.0.1',
+                port: int = 6379,
+                unix_socket: str = '',
+                max_connections: int = 50,
+                fsm_max_connections: int = 0,
+                pool_timeout: float = 5.0,
+                socket_timeout: float = 5.0,
+                connect_timeout: float = 2.0,
+                health_check_interval: int = 30,
+                retries: int = 3,
+                retry_backoff: float = 0.05,
+                retry_backoff_cap: float = 1.0,
+                retry_on_timeout: bool = False
+        ) -> None:
             self.db = db
             self.host = host
             self.port = port
+            self.unix_socket = unix_socket
+            self.max_connections = max_connections
+            self.fsm_max_connections = fsm_max_connections
+            self.pool_timeout = pool_timeout
+            self.socket_timeout = socket_timeout
+            self.connect_timeout = connect_timeout
+            self.health_check_interval = health_check_interval
+            self.retries = retries
+            self.retry_backoff = retry_backoff
+            self.retry_backoff_cap = retry_backoff_cap
+            self.retry_on_timeout = retry_on_timeout
+
+    @dataclass
+    class AdminCache:
+        ttl: int
+        shared: bool
+
+        def __init__(self, ttl: int = 300, shared: bool = False) -> None:
+            self.ttl = ttl
+            self.shared = shared
+
+    @dataclass
+    class Webhook:
+        base_url: str
+        path: str
+        host: str
+        port: int
+        unix_socket: str
+        max_connections: int
+
+        def __init__(
+                self,
+                base_url: str = '',
+                path: str = '/webhook',
+                host: str = '127.0.0.1',
+                port: int = 8080,
+                unix_socket: str = '',
+                max_connections: int = 40
+        ) -> None:
+            self.base_url = base_url.rstrip('/')
+            self.path = '/' + path.strip('/')
+            self.host = host
+            self.port = port
+            self.unix_socket = unix_socket
+            self.max_connections = max_connections
+
+    @dataclass
+    class Outbound:
+        global_rate: float
+        private_rate: float
+        private_burst: int
+        group_rate: float
+        group_burst: int
+        max_retries: int
+        max_chat_buckets: int
+
+        def __init__(
+                self,
+                global_rate: float = 30,
+                private_rate: float = 1,
+                private_burst: int = 3,
+                group_rate: float = 20,
+                group_burst: int = 5,
+                max_retries: int = 3,
+                max_chat_buckets: int = 10000
+        ) -> None:
+            self.global_rate = global_rate
+            self.private_rate = private_rate
+            self.private_burst = private_burst
+            self.group_rate = group_rate
+            self.group_burst = group_burst
+            self.max_retries = max_retries
+            self.max_chat_buckets = max_chat_buckets
+
+    @dataclass
+    class Newsletter:
+        batch_size: int
+        concurrency: int
+        progress_interval: int
+        lease: int
+
+        def __init__(
+                self,
+                batch_size: int = 500,
+                concurrency: int = 30,
+                progress_interval: int = 5,
+                lease: int = 120
+        ) -> None:
+            self.batch_size = batch_size
+            self.concurrency = concurrency
+            self.progress_interval = progress_interval
+            self.lease = lease
+
+    @dataclass
+    class Links:
+        bucket_size: int
+        retention: int
+        history_size: int
+
+        def __init__(
+                self,
+                bucket_size: int = 100,
+                retention: int = 90 * 24 * 60 * 60,
+                history_size: int = 128
+        ) -> None:
+            self.bucket_size = bucket_size
+            self.retention = retention
+            self.history_size = history_size
+
+    @dataclass
+    class Queue:
+        role: str
+        shards: int
+        workers: int
+        shards_per_consumer: int
+        batch: int
+        block: int
+        lease: int
+        maxlen: int
+
+        def __init__(
+                self,
+                role: str = 'all',
+                shards: int = 16,
+                workers: int = 4,
+                shards_per_consumer: int = 0,
+                batch: int = 50,
+                block: int = 1000,
+                lease: int = 15000,
+                maxlen: int = 100000
+        ) -> None:
+            self.role = role
+            self.shards = shards
+            self.workers = workers
+            self.shards_per_consumer = shards_per_consumer
+            self.batch = batch
+            self.block = block
+            self.lease = lease
+            self.maxlen = maxlen
+
+    @dataclass
+    class Updates:
+        drop_pending: bool
+        catch_up: bool
+        batch: int
+        concurrency: int
+        max_age: int
+        flush_interval: float
+
+        def __init__(
+                self,
+                drop_pending: bool = False,
+                catch_up: bool = True,
+                batch: int = 100,
+                concurrency: int = 50,
+                max_age: int = 86400,
+                flush_interval: float = 1.0
+        ) -> None:
+            self.drop_pending = drop_pending
+            self.catch_up = catch_up
+            self.batch = batch
+            self.concurrency = concurrency
+            self.max_age = max_age
+            self.flush_interval = flush_interval
+
+    @dataclass
+    class BotData:
+        path: str
+        reload_interval: float
+
+        def __init__(
+                self,
+                path: str = 'bot_data.yaml',
+                reload_interval: float = 5.0
+        ) -> None:
+            self.path = path
+            self.reload_interval = reload_interval
+
+    @dataclass
+    class Timers:
+        poll_interval: float
+        batch: int
+        lease: int
+
+        def __init__(
+                self,
+                poll_interval: float = 1.0,
+                batch: int = 100,
+                lease: int = 30
+        ) -> None:
+            self.poll_interval = poll_interval
+            self.batch = batch
+            self.lease = lease
+
+    @dataclass
+    class Isolation:
+        backend: str
+        lease: int
+        poll_min: int
+        poll_max: int
+        max_local_locks: int
+
+        def __init__(
+                self,
+                backend: str = 'redis',
+                lease: int = 5000,
+                poll_min: int = 5,
+                poll_max: int = 100,
+                max_local_locks: int = 10000
+        ) -> None:
+            self.backend = backend
+            self.lease = lease
+            self.poll_min = poll_min
+            self.poll_max = poll_max
+            self.max_local_locks = max_local_locks
+
+    @dataclass
+    class Logging:
+        path: str
+        level: str
+        json: bool
+        rotation: str
+        max_bytes: int
+        backup_count: int
+        sampling: float
+        levels: dict
+
+        def __init__(
+                self,
+                path: str = 'logs',
+                level: str = 'DEBUG',
+                json: bool = False,
+                rotation: str = 'size',
+                max_bytes: int = 10485760,
+                backup_count: int = 10,
+                sampling: float = 1.0,
+                levels: dict = None
+        ) -> None:
+            self.path = path
+            self.level = level
+            self.json = json
+            self.rotation = rotation
+            self.max_bytes = max_bytes
+            self.backup_count = backup_count
+            self.sampling = sampling
+            self.levels = levels or {}
+
+    @dataclass
+    class Metrics:
+        enabled: bool
+        host: str
+        port: int
+        path: str
+
+        def __init__(
+                self,
+                enabled: bool = True,
+                host: str = '127.0.0.1',
+                port: int = 9464,
+                path: str = '/metrics'
+        ) -> None:
+            self.enabled = enabled
+            self.host = host
+            self.port = port
+            self.path = '/' + path.strip('/')
+
+    @dataclass
+    class Tracing:
+        enabled: bool
+        sample_rate: float
+        slow_threshold: float
+        profile: bool
+        max_spans: int
+
+        def __init__(
+                self,
+                enabled: bool = False,
+                sample_rate: float = 0.01,
+                slow_threshold: float = 1.0,
+                profile: bool = False,
+                max_spans: int = 1000
+        ) -> None:
+            self.enabled = enabled
+            self.sample_rate = sample_rate
+            self.slow_threshold = slow_threshold
+            self.profile = profile
+            self.max_spans = max_spans
+
+    @dataclass
+    class Capture:
+        enabled: bool
+        path: str
+        max_bytes: int
+        backup_count: int
+        flush_interval: float
+        hashed_fields: list
+
+        def __init__(
+                self,
+                enabled: bool = False,
+                path: str = 'captures',
+                max_bytes: int = 67108864,
+                backup_count: int = 20,
+                flush_interval: float = 1.0,
+                hashed_fields: list = None
+        ) -> None:
+            self.enabled = enabled
+            self.path = path
+            self.max_bytes = max_bytes
+            self.backup_count = backup_count
+            self.flush_interval = flush_interval
+            self.hashed_fields = hashed_fields or [
+                'first_name', 'last_name', 'username', 'phone_number',
+                'email', 'text', 'caption', 'url', 'id', 'user_id'
+            ]
 
     __app: App
     __bots: dict[str, Bot]
     __redis: Redis
+    __admin_cache: AdminCache
+    __webhook: Webhook
+    __outbound: Outbound
+    __newsletter: Newsletter
+    __links: Links
+    __queue: Queue
+    __updates: Updates
+    __bot_data: BotData
+    __timers: Timers
+    __isolation: Isolation
+    __logging: Logging
+    __metrics: Metrics
+    __tracing: Tracing
+    __capture: Capture
 
     def __init__(self):
         LOGGER.debug('load configuration')
         config_data = self.read_yaml(file_path=self.CONFIG_PATH)
         self.__app = self.App(
-            debug=config_data['App']['debug']
+            debug=config_data['App']['debug'],
+            mode=config_data['App'].get('mode', 'polling')
         )
         self.__bots = {
             bot['id']: self.Bot(
@@ -92,11 +452,25 @@ class Config:
                 admin_chat=bot['admin_chat'],
             ) for bot in config_data['Bots']
         }
-        self.__redis = self.Redis(
-            db=config_data['Redis']['db'],
-            host=config_data['Redis']['host'],
-            port=config_data['Redis']['port']
+        self.__redis = self.Redis(**config_data['Redis'])
+        self.__admin_cache = self.AdminCache(
+            **config_data.get('AdminCache', {})
         )
+        self.__webhook = self.Webhook(**config_data.get('Webhook', {}))
+        self.__outbound = self.Outbound(**config_data.get('Outbound', {}))
+        self.__newsletter = self.Newsletter(
+            **config_data.get('Newsletter', {})
+        )
+        self.__links = self.Links(**config_data.get('Links', {}))
+        self.__queue = self.Queue(**config_data.get('Queue', {}))
+        self.__updates = self.Updates(**config_data.get('Updates', {}))
+        self.__bot_data = self.BotData(**config_data.get('BotData', {}))
+        self.__timers = self.Timers(**config_data.get('Timers', {}))
+        self.__isolation = self.Isolation(**config_data.get('Isolation', {}))
+        self.__logging = self.Logging(**config_data.get('Logging', {}))
+        self.__metrics = self.Metrics(**config_data.get('Metrics', {}))
+        self.__tracing = self.Tracing(**config_data.get('Tracing', {}))
+        self.__capture = self.Capture(**config_data.get('Capture', {}))
 
     @property
     def app(self) -> App:
@@ -110,6 +484,62 @@ class Config:
     def redis(self) -> Redis:
         return self.__redis
 
+    @property
+    def admin_cache(self) -> AdminCache:
+        return self.__admin_cache
+
+    @property
+    def webhook(self) -> Webhook:
+        return self.__webhook
+
+    @property
+    def outbound(self) -> Outbound:
+        return self.__outbound
+
+    @property
+    def newsletter(self) -> Newsletter:
+        return self.__newsletter
+
+    @property
+    def links(self) -> Links:
+        return self.__links
+
+    @property
+    def queue(self) -> Queue:
+        return self.__queue
+
+    @property
+    def updates(self) -> Updates:
+        return self.__updates
+
+    @property
+    def bot_data(self) -> BotData:
+        return self.__bot_data
+
+    @property
+    def timers(self) -> Timers:
+        return self.__timers
+
+    @property
+    def isolation(self) -> Isolation:
+        return self.__isolation
+
+    @property
+    def logging(self) -> Logging:
+        return self.__logging
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
+    @property
+    def tracing(self) -> Tracing:
+        return self.__tracing
+
+    @property
+    def capture(self) -> Capture:
+        return self.__capture
+
     @classmethod
     def read_yaml(cls, file_path: str) -> dict:
         """Used to read the data from the given configuration file."""
@@ -148,10 +578,9 @@ def check_bot_token(bot_id: int) -> bool:
     :return: True if the token exists and is non-empty,
         raises RuntimeError otherwise
     """
-    env_vars = dotenv.dotenv_values()
     required_var = BOT_TOKEN_FORMAT.format(bot_id)
 
-    if required_var not in env_vars or not env_vars[required_var]:
+    if not get_env(required_var):
         raise RuntimeError(
             f'Please, provide {required_var} variable in .env file. '
             'See example on .env.template'
@@ -160,5 +589,43 @@ def check_bot_token(bot_id: int) -> bool:
     return True
 
 
-dotenv.load_dotenv()
-CONFIG = Config()
+@functools.cache
+def load_env() -> None:
+    """Loads the ``.env`` file into the environment once per process;
+    variables already set in the environment take precedence.
+    """
+    dotenv.load_dotenv()
+
+
+def get_env(name: str, default: str = '') -> str:
+    """Returns an environment variable, reading ``.env`` on first use."""
+    load_env()
+    return os.environ.get(name, default)
+
+
+class LazyConfig:
+    """Stands in for the ``Config`` singleton until it is first used.
+
+    Importing the app reads no files; ``default.yaml`` and ``.env`` are
+    loaded on the first attribute access, inside the app's error
+    handling, and only once.
+    """
+
+    def __init__(self) -> None:
+        self.__config: Union[None, Config] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.__config is not None
+
+    def load(self) -> Config:
+        if self.__config is None:
+            load_env()
+            self.__config = Config()
+        return self.__config
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+
+CONFIG = LazyConfig()
@@ -1,62 +1,150 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os.path
-from datetime import datetime
+import queue
+import random
+from typing import Any, Union
 
 LOG_FORMAT = ('%(asctime)s.%(msecs)-3d - %(levelname)-8s '
               '- %(name)s.%(funcName)s(line%(lineno)d): '
               '%(message)s')
 LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_PATH = 'logs'
+# records of this logger go to slow.log only
+SLOW_LOGGER = 'slow_updates'
+# chatty libraries, unless the Logging section sets their level
+QUIET_LOGGERS = {'urllib3': logging.WARNING, 'asyncio': logging.WARNING}
 
-logging.basicConfig(
-    format=LOG_FORMAT,
-    datefmt=LOG_DATE_FORMAT,
-    level=logging.DEBUG
-)
-logFileFormatter = logging.Formatter(
-    fmt=LOG_FORMAT,
-    datefmt=LOG_DATE_FORMAT,
-)
 
-date_now = datetime.utcnow().date()
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors. Tracebacks are
+    already merged into the message by the ``QueueHandler``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': f'{self.formatTime(record, LOG_DATE_FORMAT)}.'
+                    f'{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage()
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rate`` share of records below WARNING."""
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 \
+            or random.random() < self.rate
 
 
-def create_folders(path: str):
-    os.makedirs(path, exist_ok=True)
+class ExcludeFilter(logging.Filter):
+    """Drops records of the named logger and its children."""
 
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not super().filter(record)
 
-def get_error_handler(path: str):
-    error_handler = logging.FileHandler(
-        filename=f'{path}/{date_now.year}-{date_now.month}-errors.log',
-        encoding='utf-8')
-    error_handler.setFormatter(logFileFormatter)
-    error_handler.setLevel(level=logging.ERROR)
-    return error_handler
 
+class LogPipeline:
+    """Moves log output off the event loop.
 
-def get_runtime_handler(path: str):
-    runtime_handler = logging.FileHandler(
-        filename=f'{path}/{date_now.year}-{date_now.month}-runtime.log',
-        encoding='utf-8')
-    runtime_handler.setFormatter(logFileFormatter)
-    runtime_handler.setLevel(level=logging.DEBUG)
-    return runtime_handler
+    Loggers only put records into a queue through the root logger's
+    ``QueueHandler``; a ``QueueListener`` thread writes them to the
+    console and to one shared pair of rotating files (``runtime.log``
+    and ``errors.log``); slow update traces get their own ``slow.log``.
+    Importing the module writes nothing: entry points (``start_app``,
+    the benchmarks and the maintenance scripts) call ``configure`` once
+    they know the ``Logging`` section. Until then only warnings reach
+    stderr through the ``logging`` fallback.
+    """
+
+    def __init__(self) -> None:
+        self.sampling = SamplingFilter()
+        self.__queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.__queue_handler = logging.handlers.QueueHandler(self.__queue)
+        self.__queue_handler.addFilter(self.sampling)
+        self.__listener: Union[None, logging.handlers.QueueListener] = None
+        atexit.register(self.stop)
+
+    def configure(
+            self,
+            path: str = LOG_PATH,
+            level: Union[int, str] = logging.DEBUG,
+            json_format: bool = False,
+            rotation: str = 'size',
+            max_bytes: int = 10 * 1024 * 1024,
+            backup_count: int = 10,
+            sampling: float = 1.0,
+            levels: Union[None, dict[str, Any]] = None
+    ) -> None:
+        os.makedirs(path, exist_ok=True)
+        formatter = JsonFormatter() if json_format else logging.Formatter(
+            fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        handlers = [logging.StreamHandler()]
+        for filename, handler_level in (('runtime.log', logging.NOTSET),
+                                        ('errors.log', logging.ERROR),
+                                        ('slow.log', logging.NOTSET)):
+            filename = os.path.join(path, filename)
+            if rotation == 'daily':
+                handler = logging.handlers.TimedRotatingFileHandler(
+                    filename, when='midnight', backupCount=backup_count,
+                    encoding='utf-8', utc=True)
+            else:
+                handler = logging.handlers.RotatingFileHandler(
+                    filename, maxBytes=max_bytes, backupCount=backup_count,
+                    encoding='utf-8')
+            handler.setLevel(handler_level)
+            handlers.append(handler)
+        for handler in handlers[:-1]:
+            handler.addFilter(ExcludeFilter(SLOW_LOGGER))
+        handlers[-1].addFilter(logging.Filter(SLOW_LOGGER))
+        for handler in handlers:
+            handler.setFormatter(formatter)
 
+        self.stop()
+        root = logging.getLogger()
+        root.setLevel(level)
+        if self.__queue_handler not in root.handlers:
+            root.addHandler(self.__queue_handler)
+        logging.getLogger(SLOW_LOGGER).setLevel(logging.WARNING)
+        for name, logger_level in {**QUIET_LOGGERS, **(levels or {})}.items():
+            logging.getLogger(name).setLevel(logger_level)
+        self.sampling.rate = sampling
+        self.__listener = logging.handlers.QueueListener(
+            self.__queue, *handlers, respect_handler_level=True)
+        self.__listener.start()
 
-logging.getLogger('urllib3').setLevel(logging.WARNING)
-logging.getLogger('asyncio').setLevel(logging.WARNING)
+    def stop(self) -> None:
+        """Flushes queued records and closes the files."""
+        if self.__listener:
+            self.__listener.stop()
+            for handler in self.__listener.handlers:
+                handler.close()
+            self.__listener = None
 
 
-def get_logger(name: str, path: str) -> logging.Logger:
+LOG_PIPELINE = LogPipeline()
+
+
+def get_logger(name: str) -> logging.Logger:
     """Function implement configuration and get new logger
 
+    Records go to the shared pipeline through the root logger, so no
+    handlers are attached here.
+
     Arguments:
         name (str): Logger name
-        path (str): Path to log file
     Return:
         Configured logger
     """
-    create_folders(path)
-    logger = logging.getLogger(name)
-    logger.addHandler(get_error_handler(path))
-    logger.addHandler(get_runtime_handler(path))
-    return logger
+    return logging.getLogger(name)
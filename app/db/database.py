@@ -1,23 +1,134 @@
-import dotenv
+import asyncio
+import time
+from typing import Any, Iterable, Union
+
 from redis.asyncio.client import Redis
-from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.asyncio.connection import (
+    AbstractConnection,
+    BlockingConnectionPool,
+    UnixDomainSocketConnection
+)
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import (
+    ConnectionError as RedisConnectionError,
+    TimeoutError as RedisTimeoutError
+)
 
-from app.configuration.config_loader import CONFIG
+from app.configuration.config_loader import CONFIG, Config, get_env
 from app.configuration.log import get_logger
+from app.metrics.instrumentation import InstrumentedRedis
 
-LOGGER = get_logger(__name__, 'logs/redis')
+LOGGER = get_logger(__name__)
 
 INPUT_KEY_FORMAT = 'input:{bot_id}:{forwarded_message_id}'
 BANNED_KEY_FORMAT = 'banned:{bot_id}'
 
+# Converts a legacy ``banned:{bot_id}`` list into a set in place.
+# Returns the number of migrated entries or -1 if the key is not a list.
+MIGRATE_BANNED_LIST_SCRIPT = """
+if redis.call('TYPE', KEYS[1])['ok'] ~= 'list' then
+    return -1
+end
+local members = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+for i = 1, #members, 1000 do
+    redis.call('SADD', KEYS[1], unpack(members, i, math.min(i + 999, #members)))
+end
+return #members
+"""
+# Extend or drop a lease (a key holding the owner's token) only while
+# it is still held by the caller.
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class MonitoredConnectionPool(BlockingConnectionPool):
+    """Connection pool capped at ``max_connections`` that keeps
+    utilisation figures.
+
+    When every connection is in use callers wait up to ``timeout``
+    seconds for one to be released instead of opening more; such waits
+    and the time spent in them are counted.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def stats(self) -> dict[str, Union[int, float]]:
+        return {
+            'max': self.max_connections,
+            'in_use': len(self._in_use_connections),
+            'idle': len(self._available_connections),
+            'waits': self.waits,
+            'wait_seconds': self.wait_seconds
+        }
+
+    async def get_connection(self, command_name: Any, *keys: Any,
+                             **options: Any) -> AbstractConnection:
+        if self.can_get_connection():
+            return await super().get_connection(command_name, *keys,
+                                                **options)
+        self.waits += 1
+        started_at = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys,
+                                                **options)
+        finally:
+            self.wait_seconds += time.perf_counter() - started_at
 
-def get_db_instance() -> Redis:
-    return Redis(
-        host=CONFIG.redis.host,
-        port=CONFIG.redis.port,
-        password=dotenv.dotenv_values().get('REDIS_PASSWORD', ''),
-        db=CONFIG.redis.db,
-    )
+
+def create_connection_pool(
+        settings: Config.Redis,
+        max_connections: int
+) -> MonitoredConnectionPool:
+    retry_on = (RedisConnectionError, RedisTimeoutError) \
+        if settings.retry_on_timeout else (RedisConnectionError,)
+    kwargs = {
+        'db': settings.db,
+        'password': get_env('REDIS_PASSWORD') or None,
+        'socket_timeout': settings.socket_timeout or None,
+        'socket_connect_timeout': settings.connect_timeout or None,
+        'health_check_interval': settings.health_check_interval,
+        'retry': Retry(
+            ExponentialBackoff(cap=settings.retry_backoff_cap,
+                               base=settings.retry_backoff),
+            settings.retries,
+            supported_errors=retry_on
+        )
+    }
+    if settings.unix_socket:
+        kwargs.update(connection_class=UnixDomainSocketConnection,
+                      path=settings.unix_socket)
+    else:
+        kwargs.update(host=settings.host, port=settings.port,
+                      socket_keepalive=True)
+    return MonitoredConnectionPool(max_connections=max_connections,
+                                   timeout=settings.pool_timeout,
+                                   **kwargs)
+
+
+def get_db_instance(max_connections: Union[None, int] = None) -> Redis:
+    """A client with its own pool of ``max_connections`` connections,
+    ``Redis.max_connections`` by default; closing the client closes
+    the pool.
+    """
+    redis_class = InstrumentedRedis if CONFIG.metrics.enabled else Redis
+    return redis_class.from_pool(create_connection_pool(
+        CONFIG.redis, max_connections or CONFIG.redis.max_connections))
 
 
 async def test_connection(db: Redis) -> None:
@@ -27,3 +138,21 @@ async def test_connection(db: Redis) -> None:
     except RedisConnectionError as ce:
         LOGGER.fatal(ce)
         raise ce
+
+
+async def migrate_banned_lists(db: Redis, bot_ids: Iterable[int]) -> None:
+    """One-shot migration of ban lists from Redis LIST to SET keys.
+
+    Safe to run on every start: keys that are already sets (or missing)
+    are left untouched.
+    """
+    migrate = db.register_script(MIGRATE_BANNED_LIST_SCRIPT)
+    bot_ids = list(bot_ids)
+    counts = await asyncio.gather(*(
+        migrate(keys=[BANNED_KEY_FORMAT.format(bot_id=bot_id)])
+        for bot_id in bot_ids
+    ))
+    for bot_id, count in zip(bot_ids, counts):
+        if count >= 0:
+            LOGGER.info('migrated %d banned users of bot %s to set',
+                        count, bot_id)
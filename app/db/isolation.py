@@ -0,0 +1,149 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from redis.asyncio.client import Redis
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+from app.db.database import RELEASE_LEASE_SCRIPT, RENEW_LEASE_SCRIPT
+
+LOGGER = get_logger(__name__)
+
+# the hash tag keeps all locks of a chat in one cluster slot
+ISOLATION_KEY = 'isolation:{{{bot_id}:{chat_id}}}:{user_id}:{thread_id}:' \
+                '{destiny}'
+WAIT_BUCKETS = (0.005, 0.05, 0.5, 5.0)  # sec
+
+
+class DistributedEventIsolation(BaseEventIsolation):
+    """Per-chat event isolation shared by all processes of the app.
+
+    Updates of one storage key first queue on a local ``asyncio.Lock``,
+    so only one task per process competes for the Redis lease. The lease
+    is a short-lived key renewed while the handler runs; a crashed
+    holder blocks the chat for at most ``lease`` ms. The local lock table
+    is an LRU of at most ``max_local_locks`` entries, locks in use are
+    never evicted. With ``backend: local`` the Redis step is skipped.
+    """
+
+    def __init__(self, db: Redis, settings: Config.Isolation):
+        self.db = db
+        self.settings = settings
+        self.acquired = 0
+        self.contended = 0
+        self.leases_lost = 0
+        self.evicted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS) + 1)
+        # storage key -> [lock, tasks holding or waiting for it]
+        self.__locks: OrderedDict[StorageKey, list] = OrderedDict()
+        self.__renew_lease = db.register_script(RENEW_LEASE_SCRIPT)
+        self.__release_lease = db.register_script(RELEASE_LEASE_SCRIPT)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            'acquired': self.acquired,
+            'contended': self.contended,
+            'leases_lost': self.leases_lost,
+            'local_locks': len(self.__locks),
+            'evicted': self.evicted,
+            'wait_total': self.wait_total,
+            'wait_max': self.wait_max,
+            'wait_histogram': dict(zip(
+                (*map(str, WAIT_BUCKETS), '+Inf'), self.wait_histogram))
+        }
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        started_at = time.monotonic()
+        entry = self.__take_local(key)
+        try:
+            async with entry[0]:
+                if self.settings.backend != 'redis':
+                    self.__observe(time.monotonic() - started_at)
+                    yield
+                    return
+                redis_key = ISOLATION_KEY.format(
+                    bot_id=key.bot_id,
+                    chat_id=key.chat_id,
+                    user_id=key.user_id,
+                    thread_id=key.thread_id or '',
+                    destiny=key.destiny
+                )
+                token = await self.__acquire(redis_key)
+                self.__observe(time.monotonic() - started_at)
+                keeper = asyncio.create_task(
+                    self.__keep_lease(redis_key, token))
+                try:
+                    yield
+                finally:
+                    keeper.cancel()
+                    await self.__release_lease(keys=[redis_key],
+                                               args=[token])
+        finally:
+            entry[1] -= 1
+
+    async def close(self) -> None:
+        self.__locks.clear()
+
+    def __take_local(self, key: StorageKey) -> list:
+        if entry := self.__locks.get(key):
+            self.__locks.move_to_end(key)
+            entry[1] += 1
+        else:
+            # counted as busy before eviction, so it can't evict itself
+            entry = self.__locks[key] = [asyncio.Lock(), 1]
+            self.__evict()
+        return entry
+
+    def __evict(self) -> None:
+        busy = 0
+        while len(self.__locks) > self.settings.max_local_locks \
+                and busy < len(self.__locks):
+            key, (_, users) = next(iter(self.__locks.items()))
+            if users:
+                self.__locks.move_to_end(key)
+                busy += 1
+            else:
+                del self.__locks[key]
+                self.evicted += 1
+
+    async def __acquire(self, redis_key: str) -> str:
+        token = uuid.uuid4().hex
+        delay = self.settings.poll_min
+        if await self.db.set(redis_key, token, nx=True,
+                             px=self.settings.lease):
+            return token
+        self.contended += 1
+        while True:
+            await asyncio.sleep(delay / 1000)
+            if await self.db.set(redis_key, token, nx=True,
+                                 px=self.settings.lease):
+                return token
+            delay = min(delay * 2, self.settings.poll_max)
+
+    async def __keep_lease(self, redis_key: str, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.settings.lease / 3000)
+            if not await self.__renew_lease(keys=[redis_key],
+                                            args=[token, self.settings.lease]):
+                self.leases_lost += 1
+                LOGGER.warning('isolation lease %s lost', redis_key)
+                return
+
+    def __observe(self, waited: float) -> None:
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if waited <= bound:
+                self.wait_histogram[i] += 1
+                return
+        self.wait_histogram[-1] += 1
@@ -0,0 +1,223 @@
+"""Memory footprint report for forwarded message -> user links.
+
+Usage::
+
+    python -m app.db.memory_report [--migrate] [--index] [--audience]
+                                   [--sample N]
+
+Compares the legacy ``input:{bot_id}:{message_id}`` string keys with the
+bucketed ``links:{bot_id}:{bucket}`` hashes. ``--migrate`` moves legacy
+keys into buckets and ``--index`` builds the per-user
+``history:{bot_id}:{user_id}`` index from the buckets and the legacy
+keys left before reporting. ``--audience`` adds the users of those links
+to the ``users:{bot_id}`` newsletter audience.
+"""
+import argparse
+import asyncio
+from typing import AsyncIterator, Iterable
+
+from redis.asyncio.client import Redis
+
+from app.configuration.config_loader import CONFIG
+from app.configuration.log import LOG_PIPELINE
+from app.db.database import get_db_instance, test_connection
+from app.services.user_service import (
+    FORWARD_MESSAGE_KEY,
+    LINKS_KEY,
+    USERS_KEY,
+    add_history,
+    get_links_key
+)
+
+SCAN_COUNT = 1000
+MIGRATE_BATCH = 500
+
+
+async def measure(db: Redis, pattern: str, sample: int,
+                  hashes: bool) -> dict[str, float]:
+    """Counts keys matching the pattern and estimates their memory
+    from ``MEMORY USAGE`` of the first ``sample`` keys.
+    """
+    keys = links = sampled_keys = sampled_links = sampled_bytes = 0
+    async for key in db.scan_iter(match=pattern, count=SCAN_COUNT):
+        entries = await db.hlen(key) if hashes else 1
+        keys += 1
+        links += entries
+        if sampled_keys < sample:
+            sampled_keys += 1
+            sampled_links += entries
+            sampled_bytes += await db.memory_usage(key, samples=0) or 0
+    bytes_per_link = sampled_bytes / sampled_links if sampled_links else 0
+    return {
+        'keys': keys,
+        'links': links,
+        'bytes_per_link': bytes_per_link,
+        'total_bytes': bytes_per_link * links
+    }
+
+
+async def migrate(db: Redis, bot_id: int) -> int:
+    pattern = FORWARD_MESSAGE_KEY.format(bot_id=bot_id,
+                                         forwarded_message_id='*')
+    migrated = 0
+    batch = []
+    async for key in db.scan_iter(match=pattern, count=SCAN_COUNT):
+        batch.append(key)
+        if len(batch) >= MIGRATE_BATCH:
+            migrated += await migrate_batch(db, bot_id, batch)
+            batch.clear()
+    if batch:
+        migrated += await migrate_batch(db, bot_id, batch)
+    return migrated
+
+
+async def migrate_batch(db: Redis, bot_id: int, keys: list[bytes]) -> int:
+    """Copies the links of ``keys`` into buckets and deletes the copied
+    keys; keys that expired meanwhile or aren't links are left alone.
+    """
+    values = await db.mget(keys)
+    migrated = []
+    async with db.pipeline(transaction=False) as pipe:
+        for key, user_id in zip(keys, values):
+            message_id = key.rsplit(b':', 1)[-1].decode()
+            if user_id and message_id.isdigit():
+                bucket_key = get_links_key(bot_id, int(message_id))
+                pipe.hset(bucket_key, message_id, user_id)
+                pipe.expire(bucket_key, CONFIG.links.retention)
+                migrated.append(key)
+        if migrated:
+            pipe.delete(*migrated)
+        await pipe.execute()
+    return len(migrated)
+
+
+async def iter_links(
+        db: Redis,
+        bot_id: int
+) -> AsyncIterator[list[tuple[bytes, bytes]]]:
+    """Yields ``(message_id, user_id)`` links in batches, from all buckets
+    and from the legacy keys not migrated yet.
+    """
+    pattern = LINKS_KEY.format(bot_id=bot_id, bucket='*')
+    async for key in db.scan_iter(match=pattern, count=SCAN_COUNT):
+        yield list((await db.hgetall(key)).items())
+    pattern = FORWARD_MESSAGE_KEY.format(bot_id=bot_id,
+                                         forwarded_message_id='*')
+    batch = []
+    async for key in db.scan_iter(match=pattern, count=SCAN_COUNT):
+        batch.append(key)
+        if len(batch) >= MIGRATE_BATCH:
+            yield await read_legacy_batch(db, batch)
+            batch.clear()
+    if batch:
+        yield await read_legacy_batch(db, batch)
+
+
+async def read_legacy_batch(db: Redis,
+                            keys: list[bytes]) -> list[tuple[bytes, bytes]]:
+    values = await db.mget(keys)
+    links = []
+    for key, user_id in zip(keys, values):
+        message_id = key.rsplit(b':', 1)[-1]
+        if user_id and message_id.isdigit():
+            links.append((message_id, user_id))
+    return links
+
+
+async def build_history(db: Redis, bot_id: int) -> int:
+    """Adds all links to the per-user history index."""
+    indexed = 0
+    async for links in iter_links(db, bot_id):
+        indexed += await index_links(db, bot_id, links)
+    return indexed
+
+
+async def build_audience(db: Redis, bot_id: int) -> int:
+    """Adds every user with a link to the newsletter audience, which
+    otherwise only holds users who wrote after it was introduced.
+    """
+    query = USERS_KEY.format(bot_id=bot_id)
+    async for links in iter_links(db, bot_id):
+        if user_ids := {int(user_id) for _, user_id in links}:
+            await db.zadd(query, {user_id: user_id for user_id in user_ids})
+    return await db.zcard(query)
+
+
+async def index_links(db: Redis, bot_id: int,
+                      links: Iterable[tuple[bytes, bytes]]) -> int:
+    by_user: dict[int, list[int]] = {}
+    for message_id, user_id in links:
+        by_user.setdefault(int(user_id), []).append(int(message_id))
+    if by_user:
+        async with db.pipeline(transaction=False) as pipe:
+            for user_id, message_ids in by_user.items():
+                add_history(pipe, bot_id, user_id, message_ids)
+            await pipe.execute()
+    return sum(map(len, by_user.values()))
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+async def report(db: Redis, sample: int) -> None:
+    for bot_id in CONFIG.bots:
+        legacy = await measure(
+            db, FORWARD_MESSAGE_KEY.format(bot_id=bot_id,
+                                           forwarded_message_id='*'),
+            sample, hashes=False
+        )
+        bucketed = await measure(
+            db, LINKS_KEY.format(bot_id=bot_id, bucket='*'),
+            sample, hashes=True
+        )
+        print(f'bot {bot_id}')
+        for title, stats in (('legacy keys', legacy),
+                             ('hash buckets', bucketed)):
+            print(f'  {title:<13} keys={stats["keys"]:<10} '
+                  f'links={stats["links"]:<10} '
+                  f'per link={stats["bytes_per_link"]:.1f} B '
+                  f'total~{format_size(stats["total_bytes"])}')
+        if legacy['bytes_per_link'] and bucketed['bytes_per_link']:
+            ratio = legacy['bytes_per_link'] / bucketed['bytes_per_link']
+            print(f'  buckets use {ratio:.1f}x less memory per link')
+
+
+async def main(args: argparse.Namespace) -> None:
+    LOG_PIPELINE.configure(path=CONFIG.logging.path,
+                           level=CONFIG.logging.level,
+                           levels=CONFIG.logging.levels)
+    db = get_db_instance()
+    await test_connection(db)
+    if args.migrate:
+        for bot_id in CONFIG.bots:
+            print(f'bot {bot_id}: migrated {await migrate(db, bot_id)} links')
+    if args.index:
+        for bot_id in CONFIG.bots:
+            print(f'bot {bot_id}: indexed '
+                  f'{await build_history(db, bot_id)} links')
+    if args.audience:
+        for bot_id in CONFIG.bots:
+            print(f'bot {bot_id}: newsletter audience of '
+                  f'{await build_audience(db, bot_id)} users')
+    await report(db, args.sample)
+    await db.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--migrate', action='store_true',
+                        help='move legacy link keys into hash buckets')
+    parser.add_argument('--index', action='store_true',
+                        help='build the per-user history index from '
+                             'hash buckets and legacy keys')
+    parser.add_argument('--audience', action='store_true',
+                        help='add users of all links to the newsletter '
+                             'audience')
+    parser.add_argument('--sample', type=int, default=1000,
+                        help='keys measured with MEMORY USAGE per layout')
+    asyncio.run(main(parser.parse_args()))
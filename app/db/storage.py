@@ -0,0 +1,178 @@
+import copy
+import datetime
+from typing import Any, Dict, Optional, Union
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+# Appends JSON-encoded items (ARGV[2], without brackets) to the JSON list
+# kept in a hash field, without decoding it, and returns the new list.
+APPEND_VALUE_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current or current == '[]' or string.sub(current, 1, 1) ~= '[' then
+    current = '[' .. ARGV[2] .. ']'
+else
+    current = string.sub(current, 1, -2) .. ',' .. ARGV[2] .. ']'
+end
+redis.call('HSET', KEYS[1], ARGV[1], current)
+if tonumber(ARGV[3]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return current
+"""
+
+
+class HashRedisStorage(RedisStorage):
+    """Redis FSM storage keeping state data as a hash of JSON fields.
+
+    Every top level key of the data is its own hash field, so single
+    values are read, written and appended to atomically on the server
+    instead of re-serialising the whole data blob, and concurrent updates
+    of different fields don't overwrite each other. Data written by
+    ``RedisStorage`` as one string is moved into the hash on first read.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.__append_value = self.redis.register_script(APPEND_VALUE_SCRIPT)
+        self.__ttl = int(self.data_ttl.total_seconds()) \
+            if isinstance(self.data_ttl, datetime.timedelta) \
+            else self.data_ttl or 0
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        redis_key = self.key_builder.build(key, 'fields')
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(redis_key)
+            if data:
+                pipe.hset(redis_key, mapping=self.__encode(data))
+                if self.__ttl:
+                    pipe.expire(redis_key, self.__ttl)
+            await pipe.execute()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        redis_key = self.key_builder.build(key, 'fields')
+        legacy_key = self.key_builder.build(key, 'data')
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(redis_key)
+            pipe.get(legacy_key)
+            fields, legacy = await pipe.execute()
+        if legacy is not None:
+            data = {**self.json_loads(legacy), **self.__decode(fields)}
+            await self.set_data(key, data)
+            await self.redis.delete(legacy_key)
+            LOGGER.debug('moved fsm data of %s into a hash', redis_key)
+            return data
+        return self.__decode(fields)
+
+    async def update_data(
+            self,
+            key: StorageKey,
+            data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        if not data:
+            return await self.get_data(key)
+        redis_key = self.key_builder.build(key, 'fields')
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(redis_key, mapping=self.__encode(data))
+            if self.__ttl:
+                pipe.expire(redis_key, self.__ttl)
+            pipe.hgetall(redis_key)
+            *_, fields = await pipe.execute()
+        return self.__decode(fields)
+
+    async def get_value(
+            self,
+            storage_key: StorageKey,
+            dict_key: str,
+            default: Optional[Any] = None
+    ) -> Optional[Any]:
+        value = await self.redis.hget(
+            self.key_builder.build(storage_key, 'fields'), dict_key)
+        return default if value is None else self.json_loads(value)
+
+    async def set_value(
+            self,
+            storage_key: StorageKey,
+            dict_key: str,
+            value: Any
+    ) -> None:
+        await self.update_data(storage_key, {dict_key: value})
+
+    async def append_value(
+            self,
+            storage_key: StorageKey,
+            dict_key: str,
+            values: list
+    ) -> list:
+        """Extends the list stored under ``dict_key`` in one step."""
+        items = self.json_dumps(values)[1:-1]
+        return self.json_loads(await self.__append_value(
+            keys=[self.key_builder.build(storage_key, 'fields')],
+            args=[dict_key, items, self.__ttl]
+        ))
+
+    def __encode(self, data: Dict[str, Any]) -> Dict[str, str]:
+        return {field: self.json_dumps(value) for field, value in data.items()}
+
+    def __decode(self, fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+        return {
+            field.decode(): self.json_loads(value)
+            for field, value in fields.items()
+        }
+
+
+class CachedFSMContext(FSMContext):
+    """FSM context of a single update.
+
+    State data is read from the storage at most once and kept in sync
+    with the writes made through this context, so helpers called one
+    after another don't read it again.
+    """
+
+    def __init__(self, storage: HashRedisStorage, key: StorageKey) -> None:
+        super().__init__(storage=storage, key=key)
+        self.__data: Union[None, Dict[str, Any]] = None
+
+    async def get_data(self) -> Dict[str, Any]:
+        if self.__data is None:
+            self.__data = await super().get_data()
+        return copy.deepcopy(self.__data)
+
+    async def get_value(
+            self,
+            key: str,
+            default: Optional[Any] = None
+    ) -> Optional[Any]:
+        if self.__data is None:
+            self.__data = await super().get_data()
+        return copy.deepcopy(self.__data.get(key, default))
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        await super().set_data(data)
+        self.__data = copy.deepcopy(data)
+
+    async def update_data(
+            self,
+            data: Optional[Dict[str, Any]] = None,
+            **kwargs: Any
+    ) -> Dict[str, Any]:
+        self.__data = await super().update_data(data, **kwargs)
+        return copy.deepcopy(self.__data)
+
+    async def set_value(self, key: str, value: Any) -> None:
+        await self.storage.set_value(self.key, key, value)
+        if self.__data is not None:
+            self.__data[key] = copy.deepcopy(value)
+
+    async def append_value(self, key: str, values: list) -> list:
+        if not values:
+            return await self.get_value(key, [])
+        current = await self.storage.append_value(self.key, key, values)
+        if self.__data is not None:
+            self.__data[key] = current
+        return copy.deepcopy(current)
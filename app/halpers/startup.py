@@ -0,0 +1,43 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class StartupTimer:
+    """Measures the phases of startup.
+
+    Phases are timed with ``phase`` as they run (work done concurrently
+    is one phase); ``report`` stops the clock and logs the breakdown
+    once the app is about to take updates.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.finished_at: Union[None, float] = None
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started_at
+
+    @property
+    def total(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {**self.phases, 'total': self.total}
+
+    def report(self) -> None:
+        self.finished_at = time.perf_counter()
+        LOGGER.info('started in %.3f s: %s', self.total, ', '.join(
+            f'{name} {seconds:.3f} s' for name, seconds in self.phases.items()
+        ))
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from redis.exceptions import RedisError
+
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class BackgroundTasks:
+    """Runs bookkeeping off the handler's critical path.
+
+    At most ``limit`` jobs are in flight; ``submit`` waits for a free slot
+    instead of piling up unbounded tasks. Jobs failing with one of
+    ``retry_on`` are retried with exponential backoff, final failures are
+    logged, and ``drain`` waits for the remaining jobs on shutdown.
+    """
+
+    def __init__(
+            self,
+            limit: int = 1000,
+            attempts: int = 3,
+            backoff: float = 0.5,
+            retry_on: tuple[type[Exception], ...] = (RedisError, OSError)
+    ):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.retry_on = retry_on
+        self.failed = 0
+        self.__slots = asyncio.Semaphore(limit)
+        self.__tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self.__tasks)
+
+    async def submit(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            *args: Any,
+            **kwargs: Any
+    ) -> None:
+        await self.__slots.acquire()
+        task = asyncio.create_task(self.__run(func, *args, **kwargs))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__done)
+
+    def __done(self, task: asyncio.Task) -> None:
+        self.__tasks.discard(task)
+        self.__slots.release()
+
+    async def __run(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            *args: Any,
+            **kwargs: Any
+    ) -> None:
+        for attempt in range(1, self.attempts + 1):
+            try:
+                await func(*args, **kwargs)
+                return
+            except self.retry_on as exc:
+                if attempt == self.attempts:
+                    self.failed += 1
+                    LOGGER.error('%s%s failed after %d attempts: %s',
+                                 func.__qualname__, args, attempt, exc)
+                    return
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            except Exception as exc:  # pylint: disable=broad-except
+                self.failed += 1
+                LOGGER.exception('%s%s failed: %s',
+                                 func.__qualname__, args, exc)
+                return
+
+    async def drain(self, timeout: float = 10) -> None:
+        if not self.__tasks:
+            return
+        LOGGER.info('waiting for %d background tasks', len(self.__tasks))
+        _, pending = await asyncio.wait(set(self.__tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            LOGGER.error('%d background tasks cancelled on shutdown',
+                         len(pending))
+
+
+BACKGROUND_TASKS = BackgroundTasks()
@@ -1,9 +1,15 @@
+import asyncio
 from contextlib import suppress
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 
+from app.db.storage import CachedFSMContext
+
+DELETE_MESSAGES_LIMIT = 100  # Bot API limit of deleteMessages
+EDIT_FALLBACK_CONCURRENCY = 5
+
 
 def chunks(target: list, count: int):
     """This function takes a list and an integer as input and yields
@@ -18,22 +24,69 @@ def chunks(target: list, count: int):
         yield target[i:i + count]
 
 
-async def add_ui_messages(messages_ids: list[int], state: FSMContext) -> None:
-    if data := await state.get_data():
-        ui_messages = data.get('ui_messages', [])
-        ui_messages.extend(messages_ids)
-        await state.update_data(ui_messages=ui_messages)
+async def add_ui_messages(
+        messages_ids: list[int],
+        state: FSMContext
+) -> None:
+    """Appends atomically through a ``CachedFSMContext``, with a read and
+    a write on any other context.
+    """
+    if isinstance(state, CachedFSMContext):
+        await state.append_value('ui_messages', messages_ids)
+        return
+    ui_messages = await state.get_value('ui_messages', [])
+    await state.update_data(ui_messages=[*ui_messages, *messages_ids])
 
 
 async def delete_ui_messages(bot: Bot, state: FSMContext) -> None:
-    if data := await state.get_data():
-        ui_messages = data.get('ui_messages', [])
-        for message_id in reversed(ui_messages):
-            await delete_or_edit_message(
-                chat_id=state.key.chat_id,
-                message_id=message_id,
-                bot=bot
-            )
+    if ui_messages := await state.get_value('ui_messages', []):
+        await delete_or_edit_messages(
+            chat_id=state.key.chat_id,
+            message_ids=list(reversed(ui_messages)),
+            bot=bot
+        )
+
+
+async def delete_messages(
+        chat_id: int,
+        message_ids: list[int],
+        bot: Bot
+) -> list[int]:
+    """Deletes messages with one ``deleteMessages`` call per
+    ``DELETE_MESSAGES_LIMIT`` ids and returns the ids of failed calls.
+    Ids Telegram can't find are skipped by the call itself.
+    """
+    failed = []
+    for chunk in chunks(message_ids, DELETE_MESSAGES_LIMIT):
+        with suppress(TelegramBadRequest):
+            if await bot.delete_messages(chat_id=chat_id,
+                                         message_ids=chunk):
+                continue
+        failed.extend(chunk)
+    return failed
+
+
+async def delete_or_edit_messages(
+        chat_id: int,
+        message_ids: list[int],
+        bot: Bot
+) -> None:
+    """Deletes messages with ``delete_messages``.
+
+    The call doesn't tell which ids failed, so only the ids of a failed
+    call fall back to ``delete_or_edit_message``, at most
+    ``EDIT_FALLBACK_CONCURRENCY`` at a time.
+    """
+    if not (failed := await delete_messages(chat_id, message_ids, bot)):
+        return
+
+    semaphore = asyncio.Semaphore(EDIT_FALLBACK_CONCURRENCY)
+
+    async def fallback(message_id: int) -> None:
+        async with semaphore:
+            await delete_or_edit_message(chat_id, message_id, bot)
+
+    await asyncio.gather(*(fallback(message_id) for message_id in failed))
 
 
 async def delete_or_edit_message(chat_id: int, message_id: int, bot: Bot):
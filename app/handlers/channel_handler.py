@@ -6,17 +6,17 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, ForceReply
 from aiogram_media_group import media_group_handler
 
-from app.configuration.config_loader import CONFIG
+from app.configuration.bot_context import BotContext
 from app.configuration.log import get_logger
 from app.halpers.utils import add_ui_messages, delete_ui_messages, \
-    delete_or_edit_message
+    delete_or_edit_message, delete_or_edit_messages
 from app.handlers.callbacks.callback import AdminCallback
 from app.handlers.filters.filter import AdminChatFilter
 from app.handlers.menu_handler import delete_menu, start_admin_call
 from app.handlers.states.state import ChannelSG
 from app.keyboards.keyboard import get_bot_link_keyboard, get_accept_keyboard
 
-LOGGER = get_logger(__name__, '../../logs')
+LOGGER = get_logger(__name__)
 
 
 async def create_message(c: CallbackQuery, bot: Bot, state: FSMContext):
@@ -42,24 +42,29 @@ async def create_message(c: CallbackQuery, bot: Bot, state: FSMContext):
 async def input_created_message_album(
         messages: List[Message],
         bot: Bot,
+        bot_context: BotContext,
         state: FSMContext
 ):
     m = messages.pop(0)
-    for message in messages:
-        await delete_or_edit_message(
-            chat_id=message.chat.id,
-            message_id=message.message_id,
+    if messages:
+        await delete_or_edit_messages(
+            chat_id=m.chat.id,
+            message_ids=[message.message_id for message in messages],
             bot=bot
         )
 
-    return await input_created_message(m, bot, state)
+    return await input_created_message(m, bot, bot_context, state)
 
 
-async def input_created_message(m: Message, bot: Bot, state: FSMContext):
-    bot_user = await bot.get_me()
+async def input_created_message(
+        m: Message,
+        bot: Bot,
+        bot_context: BotContext,
+        state: FSMContext
+):
     new_message = await m.copy_to(
         chat_id=m.chat.id,
-        reply_markup=get_bot_link_keyboard(bot_user.username)
+        reply_markup=get_bot_link_keyboard(bot_context.username)
     )
     await bot.pin_chat_message(
         chat_id=m.chat.id,
@@ -85,18 +90,19 @@ async def accept_create_message(
         c: CallbackQuery,
         callback_data: AdminCallback,
         bot: Bot,
+        bot_context: BotContext,
         state: FSMContext
 ):
-    if data := await state.get_data():
+    if tmp_message_id := await state.get_value('tmp_message_id'):
         match callback_data.data:
             case 'yes':
-                if channel_id := CONFIG.bots[bot.id].channel_id:
-                    bot_user = await bot.get_me()
+                if channel_id := bot_context.channel_id:
                     await bot.copy_message(
                         chat_id=channel_id,
                         from_chat_id=c.message.chat.id,
-                        message_id=data['tmp_message_id'],
-                        reply_markup=get_bot_link_keyboard(bot_user.url)
+                        message_id=tmp_message_id,
+                        reply_markup=get_bot_link_keyboard(
+                            bot_context.username)
                     )
                     await c.answer(
                         text='Сообщение отправлено на канал', show_alert=True
@@ -108,11 +114,11 @@ async def accept_create_message(
             case 'no':
                 await c.answer(text='❌ Вы отменили отправку сообщения')
 
-    await delete_or_edit_message(
-        chat_id=c.message.chat.id,
-        message_id=data['tmp_message_id'],
-        bot=bot
-    )
+        await delete_or_edit_message(
+            chat_id=c.message.chat.id,
+            message_id=tmp_message_id,
+            bot=bot
+        )
     await delete_or_edit_message(
         chat_id=c.message.chat.id,
         message_id=c.message.message_id,
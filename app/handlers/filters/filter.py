@@ -1,3 +1,5 @@
+import asyncio
+import time
 from typing import Union
 
 from aiogram import Bot
@@ -8,9 +10,129 @@ from aiogram.types import (
     ChatMemberOwner,
     ChatMemberAdministrator
 )
+from redis.asyncio import Redis
 
 from app.configuration.config_loader import CONFIG
 
+ADMINS_KEY = 'admins:{bot_id}'
+
+# Applies a roster change to the shared copy only while it is alive,
+# so a partial roster is never created without a TTL.
+UPDATE_SHARED_ROSTER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[1] == '1' then
+    return redis.call('SADD', KEYS[1], ARGV[2])
+end
+return redis.call('SREM', KEYS[1], ARGV[2])
+"""
+
+
+class AdminRosterCache:
+    """Per-bot cache of the admin chat roster (owner and administrators).
+
+    Rosters are fetched with ``get_chat_administrators`` and trusted for
+    ``ttl`` seconds. When a Redis instance is bound, the roster is shared
+    under ``admins:{bot_id}`` so that several workers do not each query
+    Telegram.
+    """
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self.db: Union[None, Redis] = None
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.__rosters: dict[int, tuple[float, set[int]]] = {}
+        self.__locks: dict[int, asyncio.Lock] = {}
+        self.__update_shared = None
+
+    def bind(self, ttl: int, db: Union[None, Redis] = None) -> None:
+        self.ttl = ttl
+        self.db = db
+        if db:
+            self.__update_shared = db.register_script(
+                UPDATE_SHARED_ROSTER_SCRIPT)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+            'rosters': len(self.__rosters)
+        }
+
+    async def is_admin(self, bot: Bot, user_id: int) -> bool:
+        if (roster := self.__get_fresh(bot.id)) is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            roster = await self.load(bot)
+        return user_id in roster
+
+    async def load(self, bot: Bot) -> set[int]:
+        lock = self.__locks.setdefault(bot.id, asyncio.Lock())
+        async with lock:
+            # another task may have loaded the roster while we waited
+            if (roster := self.__get_fresh(bot.id)) is not None:
+                return roster
+            roster = await self.__load_shared(bot.id)
+            if not roster:
+                roster = await self.__fetch(bot)
+                await self.__store_shared(bot.id, roster)
+            self.__rosters[bot.id] = (time.monotonic() + self.ttl, roster)
+            return roster
+
+    async def update(self, bot_id: int, user_id: int, is_admin: bool) -> None:
+        if entry := self.__rosters.get(bot_id):
+            if is_admin:
+                entry[1].add(user_id)
+            else:
+                entry[1].discard(user_id)
+        if self.__update_shared:
+            await self.__update_shared(
+                keys=[ADMINS_KEY.format(bot_id=bot_id)],
+                args=[int(is_admin), user_id]
+            )
+
+    def __get_fresh(self, bot_id: int) -> Union[None, set[int]]:
+        if entry := self.__rosters.get(bot_id):
+            expires_at, roster = entry
+            if expires_at > time.monotonic():
+                return roster
+        return None
+
+    async def __fetch(self, bot: Bot) -> set[int]:
+        self.fetches += 1
+        members = await bot.get_chat_administrators(
+            chat_id=CONFIG.bots[bot.id].admin_chat_id
+        )
+        return {
+            member.user.id for member in members
+            if isinstance(member, (ChatMemberOwner, ChatMemberAdministrator))
+        }
+
+    async def __load_shared(self, bot_id: int) -> set[int]:
+        if not self.db:
+            return set()
+        members = await self.db.smembers(ADMINS_KEY.format(bot_id=bot_id))
+        return set(map(int, members))
+
+    async def __store_shared(self, bot_id: int, roster: set[int]) -> None:
+        if not self.db or not roster:
+            return
+        key = ADMINS_KEY.format(bot_id=bot_id)
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.sadd(key, *roster)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+
+ADMIN_ROSTER = AdminRosterCache()
+
 
 class AdminChatFilter(Filter):
     async def __call__(
@@ -19,10 +141,4 @@ class AdminChatFilter(Filter):
             bot: Bot
     ) -> bool:
         if not source.from_user.is_bot:
-            chat_member = await bot.get_chat_member(
-                chat_id=CONFIG.bots[bot.id].admin_chat_id,
-                user_id=source.from_user.id
-            )
-            return isinstance(
-                chat_member, Union[ChatMemberOwner, ChatMemberAdministrator]
-            )
+            return await ADMIN_ROSTER.is_admin(bot, source.from_user.id)
@@ -1,48 +1,71 @@
-import asyncio
 from typing import Union
 
 from aiogram import Dispatcher, Bot, F
 from aiogram.enums import ChatAction, ChatType, ContentType
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import (
+    Message,
+    CallbackQuery,
+    ChatMemberUpdated,
+    ChatMemberOwner,
+    ChatMemberAdministrator
+)
 
+from app.configuration.bot_data import BotData
 from app.configuration.log import get_logger
 from app.halpers.utils import delete_or_edit_message, delete_ui_messages
 from app.handlers.callbacks.callback import AdminCallback
-from app.handlers.filters.filter import AdminChatFilter
+from app.handlers.filters.filter import AdminChatFilter, ADMIN_ROSTER
 from app.keyboards.keyboard import (
     get_admin_start_keyboard,
-    get_channel_keyboard,
-    get_keyboard_from_data
+    get_channel_keyboard
 )
+from app.services.timer_service import TimerService
+from app.services.user_service import UserService
 
-LOGGER = get_logger(__name__, '../../logs')
+LOGGER = get_logger(__name__)
 
 
-async def start(m: Message, bot: Bot, state: FSMContext, dynamic_data: dict):
+async def start(
+        m: Message,
+        bot: Bot,
+        state: FSMContext,
+        bot_data: BotData,
+        user_service: UserService,
+        timer_service: TimerService
+):
+    await user_service.add_user(bot.id, m.from_user.id)
     await state.clear()
     await delete_menu(m, bot, state)
-    start_text = dynamic_data['start_message']['text']
+    if not bot_data.start_text:
+        LOGGER.error('start message of bot %s is not configured', bot.id)
+        return
     menu = await m.answer(
-        text=start_text.format(user_mention=m.from_user.mention_markdown()),
-        reply_markup=get_keyboard_from_data(
-            buttons_data=dynamic_data['start_message'].get('buttons', [[]]))
+        text=bot_data.start_text.render(
+            user_mention=m.from_user.mention_markdown()),
+        reply_markup=bot_data.start_keyboard
     )
     await state.update_data(menu_id=menu.message_id)
-    await bot.send_chat_action(
-        chat_id=m.chat.id,
-        action=ChatAction.TYPING
-    )
-    if dynamic_data['start_message'].get('after', None):
-        await asyncio.sleep(
-            delay=dynamic_data['start_message']['after'][-1]['ttl'])
-        await m.answer(text=dynamic_data['start_message']['after'][-1]['text'])
+    if bot_data.start_after:
+        await bot.send_chat_action(
+            chat_id=m.chat.id,
+            action=ChatAction.TYPING
+        )
+        # only the last ``after`` entry is sent
+        await timer_service.send_later(
+            bot_id=bot.id,
+            chat_id=m.chat.id,
+            text=bot_data.start_after[-1].text,
+            delay=bot_data.start_after[-1].ttl
+        )
 
 
 async def start_admin(m: Message, bot: Bot, state: FSMContext):
-    if state_data := await state.get_data():
-        if tmp_message_id := state_data.get('tmp_message_id'):
+    tmp_message_id = await state.get_value('tmp_message_id')
+    if tmp_message_id or await state.get_value('ui_messages') \
+            or await state.get_value('menu_id'):
+        if tmp_message_id:
             await delete_or_edit_message(
                 chat_id=m.chat.id,
                 message_id=tmp_message_id,
@@ -83,8 +106,7 @@ async def delete_menu(
         bot: Bot,
         state: FSMContext
 ):
-    state_data = await state.get_data()
-    if menu_id := state_data.get('menu_id'):
+    if menu_id := await state.get_value('menu_id'):
         await delete_or_edit_message(
             chat_id=message_or_call.chat.id,
             message_id=menu_id,
@@ -102,7 +124,22 @@ async def delete_pinned_message(m: Message):
     await m.delete()
 
 
+async def admin_chat_member_updated(event: ChatMemberUpdated, bot: Bot):
+    await ADMIN_ROSTER.update(
+        bot_id=bot.id,
+        user_id=event.new_chat_member.user.id,
+        is_admin=isinstance(
+            event.new_chat_member,
+            (ChatMemberOwner, ChatMemberAdministrator)
+        )
+    )
+
+
 def register_main_handlers(dp: Dispatcher):
+    dp.chat_member.register(
+        admin_chat_member_updated,
+        lambda event, bot_context: event.chat.id == bot_context.admin_chat_id
+    )
     dp.message.register(
         delete_pinned_message,
         lambda message: message.chat.type == ChatType.PRIVATE,
@@ -0,0 +1,158 @@
+from contextlib import suppress
+
+from aiogram import Dispatcher, Bot, F
+from aiogram.enums import ChatType
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, ForceReply
+
+from app.configuration.log import get_logger
+from app.halpers.utils import add_ui_messages, delete_ui_messages
+from app.handlers.callbacks.callback import AdminCallback
+from app.handlers.filters.filter import AdminChatFilter
+from app.handlers.menu_handler import delete_menu, start_admin_call
+from app.handlers.states.state import NewsletterSG
+from app.keyboards.keyboard import (
+    get_accept_keyboard,
+    get_newsletter_keyboard
+)
+from app.services.newsletter_service import (
+    NewsletterService,
+    NewsletterStatus,
+    format_progress
+)
+
+LOGGER = get_logger(__name__)
+
+CONTROL_ACTIONS = {
+    'pause': NewsletterStatus.PAUSED,
+    'resume': NewsletterStatus.RUNNING,
+    'cancel': NewsletterStatus.CANCELLED,
+    'refresh': None
+}
+
+
+async def newsletter_menu(
+        c: CallbackQuery,
+        bot: Bot,
+        state: FSMContext,
+        newsletter_service: NewsletterService
+):
+    progress = await newsletter_service.get_progress(bot.id)
+    if progress.get('status') in (
+            NewsletterStatus.RUNNING.value,
+            NewsletterStatus.PAUSED.value
+    ):
+        progress_m = await c.message.answer(
+            text=format_progress(progress),
+            reply_markup=get_newsletter_keyboard(progress['status'])
+        )
+        await newsletter_service.set_progress_message(
+            bot_id=bot.id,
+            chat_id=progress_m.chat.id,
+            message_id=progress_m.message_id
+        )
+        await c.answer()
+        return
+
+    await delete_menu(c.message, bot, state)
+    await state.set_state(NewsletterSG.create_message)
+    ui_message = await c.message.answer(
+        text='➕Пришлите сообщение для рассылки',
+        reply_markup=ForceReply()
+    )
+    await add_ui_messages([ui_message.message_id], state)
+    await c.answer()
+
+
+async def input_newsletter_message(m: Message, state: FSMContext):
+    await state.set_state(NewsletterSG.accept_message)
+    await state.update_data(newsletter_message_id=m.message_id)
+    accept_m = await m.answer(
+        text='Начать рассылку?',
+        reply_markup=get_accept_keyboard()
+    )
+    await add_ui_messages(messages_ids=[accept_m.message_id], state=state)
+
+
+async def accept_newsletter(
+        c: CallbackQuery,
+        callback_data: AdminCallback,
+        bot: Bot,
+        state: FSMContext,
+        newsletter_service: NewsletterService
+):
+    message_id = await state.get_value('newsletter_message_id')
+    await delete_ui_messages(bot=bot, state=state)
+    await state.clear()
+
+    if callback_data.data != 'yes':
+        await c.answer(text='❌ Вы отменили рассылку')
+        await start_admin_call(c, bot, state)
+        return
+    if message_id is None:  # a repeated or stale confirmation
+        LOGGER.warning('newsletter of bot %s confirmed without a message',
+                       bot.id)
+        await c.answer(text='❌ Сообщение для рассылки не найдено, '
+                            'создайте рассылку заново', show_alert=True)
+        return
+
+    progress_m = await c.message.answer(text='📨 Рассылка запускается...')
+    if await newsletter_service.start(
+            bot=bot,
+            from_chat_id=c.message.chat.id,
+            message_id=message_id,
+            progress_chat_id=progress_m.chat.id,
+            progress_message_id=progress_m.message_id
+    ):
+        await c.answer(text='✅ Рассылка запущена')
+    else:
+        await c.answer(text='❌ Рассылка уже идёт', show_alert=True)
+
+
+async def control_newsletter(
+        c: CallbackQuery,
+        callback_data: AdminCallback,
+        bot: Bot,
+        newsletter_service: NewsletterService
+):
+    if status := CONTROL_ACTIONS[callback_data.data]:
+        if not await newsletter_service.set_status(bot, status):
+            await c.answer(text='Рассылка уже завершена')
+    progress = await newsletter_service.get_progress(bot.id)
+    with suppress(TelegramBadRequest):
+        await c.message.edit_text(
+            text=format_progress(progress),
+            reply_markup=get_newsletter_keyboard(progress.get('status'))
+        )
+    await c.answer()
+
+
+def register_newsletter_handlers(dp: Dispatcher):
+    dp.callback_query.register(
+        newsletter_menu,
+        AdminCallback.filter(F.action == AdminCallback.Action.NEWSLETTER),
+        AdminCallback.filter(F.data == 'menu'),
+        AdminChatFilter(),
+        lambda call: call.message.chat.type == ChatType.PRIVATE
+    )
+    dp.callback_query.register(
+        control_newsletter,
+        AdminCallback.filter(F.action == AdminCallback.Action.NEWSLETTER),
+        AdminCallback.filter(F.data.in_(CONTROL_ACTIONS)),
+        AdminChatFilter(),
+        lambda call: call.message.chat.type == ChatType.PRIVATE
+    )
+    dp.message.register(
+        input_newsletter_message,
+        AdminChatFilter(),
+        lambda message: message.chat.type == ChatType.PRIVATE,
+        NewsletterSG.create_message
+    )
+    dp.callback_query.register(
+        accept_newsletter,
+        AdminCallback.filter(F.action == AdminCallback.Action.ACCEPT),
+        AdminChatFilter(),
+        lambda call: call.message.chat.type == ChatType.PRIVATE,
+        NewsletterSG.accept_message
+    )
@@ -4,3 +4,8 @@ from aiogram.fsm.state import StatesGroup, State
 class ChannelSG(StatesGroup):
     create_message = State()
     accept_create_message = State()
+
+
+class NewsletterSG(StatesGroup):
+    create_message = State()
+    accept_message = State()
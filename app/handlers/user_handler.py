@@ -1,45 +1,129 @@
+import asyncio
+from contextlib import suppress
 from typing import List
 
 from aiogram import Dispatcher, Bot, F
 from aiogram.enums import ChatType
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
 from aiogram.filters import StateFilter, Command
 from aiogram.types import Message, ReactionTypeEmoji
 from aiogram_media_group import media_group_handler
+from redis.exceptions import RedisError
 
-from app.configuration.config_loader import CONFIG
+from app.configuration.bot_context import BotContext
+from app.configuration.bot_data import BotData
 from app.configuration.log import get_logger
+from app.halpers.tasks import BACKGROUND_TASKS
+from app.halpers.utils import delete_messages
 from app.handlers.filters.filter import AdminChatFilter
-from app.handlers.states.state import ChannelSG
+from app.handlers.states.state import ChannelSG, NewsletterSG
+from app.services.timer_service import TimerService
 from app.services.user_service import UserService
 
-LOGGER = get_logger(__name__, '../../logs')
+LOGGER = get_logger(__name__)
 
 
 async def user_ask(
         m: Message,
         bot: Bot,
-        dynamic_data: dict,
-        user_service: UserService
+        bot_context: BotContext,
+        bot_data: BotData,
+        user_service: UserService,
+        timer_service: TimerService
 ) -> None:
+    await relay_to_admin_chat([m], bot, bot_context, bot_data,
+                              user_service, timer_service)
+
+
+@media_group_handler
+async def user_ask_album(
+        messages: List[Message],
+        bot: Bot,
+        bot_context: BotContext,
+        bot_data: BotData,
+        user_service: UserService,
+        timer_service: TimerService
+) -> None:
+    await relay_to_admin_chat(messages, bot, bot_context, bot_data,
+                              user_service, timer_service)
+
+
+async def relay_to_admin_chat(
+        messages: List[Message],
+        bot: Bot,
+        bot_context: BotContext,
+        bot_data: BotData,
+        user_service: UserService,
+        timer_service: TimerService
+) -> None:
+    """Forwards a message or a whole album with a single request and
+    acknowledges it once.
+
+    The acknowledgement runs concurrently with the forward; if the
+    forward fails, the acknowledgement is withdrawn. The link is written
+    before returning, so an admin can reply right away; only a failed
+    write is retried in the background.
+    """
+    messages = sorted(messages, key=lambda message: message.message_id)
+    first_message = messages[0]
+
+    requests = [bot.forward_messages(
+        chat_id=bot_context.admin_chat_id,
+        message_thread_id=bot_context.thread_id,
+        from_chat_id=first_message.chat.id,
+        message_ids=[message.message_id for message in messages]
+    )]
+    if answer_message := bot_data.answer_message:
+        requests.append(bot.send_message(
+            chat_id=first_message.chat.id,
+            text=answer_message.text,
+            reply_to_message_id=first_message.message_id
+        ))
+    forwarded, *replies = await asyncio.gather(
+        *requests, return_exceptions=True
+    )
+
+    acks = []
+    for reply in replies:
+        if isinstance(reply, Exception):
+            LOGGER.error('answer message not sent: %s', reply)
+        else:
+            acks.append(reply)
+    if isinstance(forwarded, BaseException):
+        LOGGER.error('message %s of user %s not forwarded to admin chat %s, '
+                     'withdrawing acknowledgements %s: %s',
+                     first_message.message_id, first_message.from_user.id,
+                     bot_context.admin_chat_id,
+                     [ack.message_id for ack in acks], forwarded)
+        for ack in acks:
+            with suppress(TelegramAPIError):
+                await ack.delete()
+        if isinstance(forwarded, TelegramBadRequest):
+            return
+        raise forwarded
+
+    for ack in acks:
+        if answer_message.ttl:
+            await BACKGROUND_TASKS.submit(
+                timer_service.delete_later,
+                bot.id,
+                ack.chat.id,
+                ack.message_id,
+                answer_message.ttl
+            )
+    message_ids = [message_id.message_id for message_id in forwarded]
     try:
-        forwarded = await m.forward(
-            chat_id=CONFIG.bots[bot.id].admin_chat_id,
-            message_thread_id=CONFIG.bots[bot.id].thread_id
-        )
-        await user_service.set_user_link(
+        await user_service.set_user_links(bot.id, message_ids,
+                                          first_message.from_user.id)
+    except RedisError as exc:
+        LOGGER.warning('links of %s not written, retrying: %s',
+                       message_ids, exc)
+        await BACKGROUND_TASKS.submit(
+            user_service.set_user_links,
             bot.id,
-            forwarded.message_id,
-            m.from_user.id
+            message_ids,
+            first_message.from_user.id
         )
-        if dynamic_data['answer_message']:
-            await m.reply(
-                text=dynamic_data['answer_message']['text']
-            )
-    except TelegramBadRequest:
-        msg = ('admin chat not found! please add bot to admin chat '
-               f'id={CONFIG.bots[bot.id].admin_chat_id}')
-        LOGGER.error(msg)
 
 
 @media_group_handler
@@ -48,6 +132,7 @@ async def answer_to_user_album(
         bot: Bot,
         user_service: UserService
 ) -> None:
+    messages = sorted(messages, key=lambda message: message.message_id)
     first_message = messages[0]
     reply_message = first_message.reply_to_message
     if reply_message.forward_date:
@@ -55,9 +140,13 @@ async def answer_to_user_album(
                 bot.id,
                 reply_message.message_id
         ):
-            for m in messages:
-                if _ := await m.copy_to(chat_id=user_id):
-                    await m.react([ReactionTypeEmoji(type='emoji', emoji='✅')])
+            if _ := await bot.copy_messages(
+                    chat_id=user_id,
+                    from_chat_id=first_message.chat.id,
+                    message_ids=[m.message_id for m in messages]
+            ):
+                await first_message.react(
+                    [ReactionTypeEmoji(type='emoji', emoji='✅')])
         else:
             await first_message.answer(
                 '⚠️ Пользователь не найден, сообщение не доставлено')
@@ -142,6 +231,60 @@ async def check_ban(m: Message, bot: Bot, user_service: UserService) -> None:
                       'на сообщение пользователя')
 
 
+async def user_history(
+        m: Message,
+        bot: Bot,
+        user_service: UserService
+) -> None:
+    reply_message = m.reply_to_message
+    if reply_message.forward_date:
+        if user_id := await user_service.get_user(
+                bot.id,
+                reply_message.message_id
+        ):
+            message_ids = await user_service.get_user_history(bot.id,
+                                                              user_id)
+            await m.answer(f'📨 Сообщений пользователя: {len(message_ids)}')
+        else:
+            await m.answer('⚠️ Пользователь не найден')
+    else:
+        await m.reply('⚠️ Данная команда выполняется при ответе '
+                      'на сообщение пользователя')
+
+
+async def purge_user(
+        m: Message,
+        bot: Bot,
+        user_service: UserService
+) -> None:
+    """Deletes every indexed forward of the user from the admin chat
+    with batched ``deleteMessages`` calls.
+    """
+    reply_message = m.reply_to_message
+    if reply_message.forward_date:
+        if user_id := await user_service.get_user(
+                bot.id,
+                reply_message.message_id
+        ):
+            message_ids = await user_service.get_user_history(bot.id,
+                                                              user_id)
+            if reply_message.message_id not in message_ids:
+                message_ids.append(reply_message.message_id)
+            failed = set(await delete_messages(m.chat.id, message_ids, bot))
+            deleted = [message_id for message_id in message_ids
+                       if message_id not in failed]
+            await user_service.forget_user_history(bot.id, user_id, deleted)
+            text = f'🗑 Удалено сообщений: {len(deleted)}'
+            if failed:
+                text += f', не удалось удалить: {len(failed)}'
+            await m.answer(text)
+        else:
+            await m.answer('⚠️ Пользователь не найден')
+    else:
+        await m.reply('⚠️ Данная команда выполняется при ответе '
+                      'на сообщение пользователя')
+
+
 def register_user_handlers(dp: Dispatcher):
     dp.message.register(
         ban_user,
@@ -161,6 +304,20 @@ def register_user_handlers(dp: Dispatcher):
         AdminChatFilter(),
         lambda message: message.chat.type == ChatType.SUPERGROUP,
     )
+    dp.message.register(
+        user_history,
+        Command('history'),
+        F.reply_to_message,
+        AdminChatFilter(),
+        lambda message: message.chat.type == ChatType.SUPERGROUP,
+    )
+    dp.message.register(
+        purge_user,
+        Command('purge'),
+        F.reply_to_message,
+        AdminChatFilter(),
+        lambda message: message.chat.type == ChatType.SUPERGROUP,
+    )
     dp.message.register(
         answer_to_user_album,
         F.media_group_id,
@@ -178,8 +335,14 @@ def register_user_handlers(dp: Dispatcher):
         lambda message: message.reply_to_message.forward_date,
         ~StateFilter(ChannelSG),
     )
+    dp.message.register(
+        user_ask_album,
+        F.media_group_id,
+        lambda message: message.chat.type == ChatType.PRIVATE,
+        ~StateFilter(ChannelSG, NewsletterSG)
+    )
     dp.message.register(
         user_ask,
         lambda message: message.chat.type == ChatType.PRIVATE,
-        ~StateFilter(ChannelSG)
+        ~StateFilter(ChannelSG, NewsletterSG)
     )
@@ -1,8 +1,75 @@
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from functools import cached_property, lru_cache
+from typing import Dict, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import (
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
+    InputFile
+)
+from aiohttp import FormData
+from pydantic import ConfigDict
 
 from app.handlers.callbacks.callback import AdminCallback
 
 BOT_URL_FORMAT = 'https://t.me/{bot_username}?start='
+KEYBOARD_CACHE_SIZE = 256
+
+
+class FrozenInlineKeyboardButton(InlineKeyboardButton):
+    """Button of a ``FrozenInlineKeyboardMarkup``."""
+    model_config = ConfigDict(frozen=True)
+
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+    """Markup shared between messages by the keyboard cache.
+
+    The whole tree is immutable: rows are tuples of frozen buttons, so
+    no handler can change the markup other messages get. Its JSON is
+    serialised once, on first send.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    inline_keyboard: Tuple[Tuple[FrozenInlineKeyboardButton, ...], ...]
+
+    @cached_property
+    def serialized(self) -> str:
+        return self.model_dump_json(exclude_none=True)
+
+
+class FrozenMarkupSession(AiohttpSession):
+    """Sends the pre-serialised JSON of a ``FrozenInlineKeyboardMarkup``
+    instead of dumping the markup on every request.
+    """
+
+    def build_form_data(
+            self,
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> FormData:
+        markup = getattr(method, 'reply_markup', None)
+        if not isinstance(markup, FrozenInlineKeyboardMarkup):
+            return super().build_form_data(bot, method)
+        form = FormData(quote_fields=False)
+        files: Dict[str, InputFile] = {}
+        for key, value in method.model_dump(
+                warnings=False, exclude={'reply_markup'}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if value:
+                form.add_field(key, value)
+        form.add_field('reply_markup', markup.serialized)
+        for key, value in files.items():
+            form.add_field(key, value.read(bot),
+                           filename=value.filename or key)
+        return form
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def pack_admin_callback(action: AdminCallback.Action, data: str) -> str:
+    return AdminCallback(action=action, data=data).pack()
 
 
 # def get_start_keyboard() -> InlineKeyboardMarkup:
@@ -18,72 +85,95 @@ BOT_URL_FORMAT = 'https://t.me/{bot_username}?start='
 #     )
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_admin_start_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return FrozenInlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(
+            [FrozenInlineKeyboardButton(
                 text='Управление каналом',
-                callback_data=AdminCallback(action=AdminCallback.Action.CHANNEL,
-                                            data='menu').pack()
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.CHANNEL, 'menu')
             )],
-            [InlineKeyboardButton(
+            [FrozenInlineKeyboardButton(
                 text='Рассылка',
-                callback_data=AdminCallback(
-                    action=AdminCallback.Action.NEWSLETTER, data='menu').pack()
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.NEWSLETTER, 'menu')
             )]
         ]
     )
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_channel_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return FrozenInlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(
+            [FrozenInlineKeyboardButton(
                 text='Создать сообщение',
-                callback_data=AdminCallback(
-                    action=AdminCallback.Action.CREATE_MESSAGE,
-                    data='menu').pack()
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.CREATE_MESSAGE, 'menu')
             )],
         ])
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_bot_link_keyboard(bot_username: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return FrozenInlineKeyboardMarkup(
         inline_keyboard=[[
-            InlineKeyboardButton(
+            FrozenInlineKeyboardButton(
                 text='Прислать новость',
-                url=BOT_URL_FORMAT.format(bot_username)
+                url=BOT_URL_FORMAT.format(bot_username=bot_username)
             )
         ]]
     )
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_accept_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return FrozenInlineKeyboardMarkup(
         inline_keyboard=[[
-            InlineKeyboardButton(
+            FrozenInlineKeyboardButton(
                 text='✅Да',
-                callback_data=AdminCallback(
-                    action=AdminCallback.Action.ACCEPT,
-                    data='yes'
-                ).pack()
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.ACCEPT, 'yes')
             ),
-            InlineKeyboardButton(
+            FrozenInlineKeyboardButton(
                 text='❌Нет',
-                callback_data=AdminCallback(
-                    action=AdminCallback.Action.ACCEPT,
-                    data='no'
-                ).pack()
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.ACCEPT, 'no')
             )
         ]]
     )
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_newsletter_keyboard(
+        status: str
+) -> Union[None, InlineKeyboardMarkup]:
+    if status not in ('running', 'paused'):
+        return None
+    toggle = ('⏸ Пауза', 'pause') if status == 'running' \
+        else ('▶️ Продолжить', 'resume')
+    return FrozenInlineKeyboardMarkup(
+        inline_keyboard=[
+            [FrozenInlineKeyboardButton(
+                text=text,
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.NEWSLETTER, data)
+            ) for text, data in (toggle, ('🔄 Обновить', 'refresh'))],
+            [FrozenInlineKeyboardButton(
+                text='⛔️ Отменить',
+                callback_data=pack_admin_callback(
+                    AdminCallback.Action.NEWSLETTER, 'cancel')
+            )]
+        ]
+    )
+
+
 def get_keyboard_from_data(
         buttons_data: list[list[dict]]
 ) -> InlineKeyboardMarkup:
     kb = [
-        [InlineKeyboardButton(**button) for button in row]
+        [FrozenInlineKeyboardButton(**button) for button in row]
         for row in buttons_data
     ]
-    return InlineKeyboardMarkup(inline_keyboard=kb)
+    return FrozenInlineKeyboardMarkup(inline_keyboard=kb)
@@ -1,83 +1,332 @@
 import asyncio
 import datetime
+import secrets
+from typing import Iterable, Union
 
-import dotenv
-from aiogram import Bot, Dispatcher
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import SimpleEventIsolation
-from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.storage.redis import DefaultKeyBuilder
+from redis.asyncio.client import Redis
 
+from app.capture.capture import UpdateCapture
 from app.configuration.config_loader import (
     CONFIG,
     BOT_TOKEN_FORMAT,
-    check_bot_token
+    check_bot_token,
+    get_env
 )
-from app.configuration.log import get_logger
-from app.db.database import test_connection, get_db_instance
+from app.configuration.bot_context import build_bot_contexts
+from app.configuration.bot_data import BotDataRegistry
+from app.configuration.log import LOG_PIPELINE, get_logger
+from app.db.database import (
+    test_connection,
+    get_db_instance,
+    migrate_banned_lists
+)
+from app.db.isolation import DistributedEventIsolation
+from app.db.storage import HashRedisStorage
+from app.halpers.startup import StartupTimer
+from app.halpers.tasks import BACKGROUND_TASKS
 from app.handlers.channel_handler import register_channel_handlers
+from app.handlers.filters.filter import ADMIN_ROSTER
 from app.handlers.menu_handler import register_main_handlers
+from app.handlers.newsletter_handler import register_newsletter_handlers
 from app.handlers.user_handler import register_user_handlers
+from app.keyboards.keyboard import FrozenMarkupSession
 from app.middlewares.middleware import (
-    DynamicDataProviderMiddleware,
+    BotContextMiddleware,
+    CachedStateMiddleware,
     ChatThreadFilterMiddleware,
-    ServicesProviderMiddleware,
     BannedMiddleware
 )
+from app.metrics.instrumentation import (
+    API_METRICS,
+    UpdateMetricsMiddleware,
+    instrument_dispatcher,
+    register_stats
+)
+from app.metrics.server import start_metrics_server
+from app.metrics.tracing import TRACER, TracingMiddleware
+from app.middlewares.outbound import (
+    OUTBOUND_SCHEDULER,
+    OutboundPriorityMiddleware
+)
+from app.polling.polling import UpdateOffsetMiddleware, prepare_polling
+from app.services.ban_cache import BanCache
+from app.services.newsletter_service import NewsletterService
+from app.services.timer_service import TimerService
+from app.services.user_service import UserService
+from app.streams.update_stream import StreamIngestMiddleware, StreamWorker
+from app.webhook.webhook import start_webhook
 
-LOGGER = get_logger(__name__, 'logs')
+LOGGER = get_logger(__name__)
 
 
-async def on_startup(bots: list[Bot]):
-    await asyncio.gather(*(startup(bot) for bot in bots))
+async def on_startup(
+        bots: list[Bot],
+        newsletter_service: NewsletterService
+):
+    """Defers the per-bot startup work to background tasks, so updates
+    are taken without waiting for its Bot API round trips.
+    """
+    for bot in bots:
+        await BACKGROUND_TASKS.submit(warm_admin_roster, bot)
+        await BACKGROUND_TASKS.submit(newsletter_service.resume, bot)
+        await BACKGROUND_TASKS.submit(notify_owner, bot)
 
 
-async def startup(bot: Bot):
-    if bot_u := await bot.get_me():
-        date = datetime.datetime.now(datetime.timezone.utc).strftime('%x %X %z')
-        await bot.send_message(
-            chat_id=CONFIG.bots[bot.id].owner_id,
-            text=f'{bot_u.mention_markdown()} started at {date}'
-        )
+async def warm_admin_roster(bot: Bot):
+    try:
+        await ADMIN_ROSTER.load(bot)
+    except TelegramBadRequest as exc:
+        LOGGER.error('admin roster of bot %s not loaded: %s', bot.id, exc)
+
+
+async def notify_owner(bot: Bot):
+    bot_u = await bot.me()
+    date = datetime.datetime.now(datetime.timezone.utc).strftime('%x %X %z')
+    await bot.send_message(
+        chat_id=CONFIG.bots[bot.id].owner_id,
+        text=f'{bot_u.mention_markdown()} started at {date}'
+    )
 
 
 def register_handlers(dp):
     register_main_handlers(dp)
     register_channel_handlers(dp)
+    register_newsletter_handlers(dp)
     register_user_handlers(dp)
 
 
-async def start_app():
-    db = get_db_instance()
-    await test_connection(db)
+async def start_worker(db: Redis, dp: Dispatcher, bots: list[Bot]):
+    workflow_data = {'dispatcher': dp, 'bots': bots, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+    try:
+        await StreamWorker(db, dp, bots, CONFIG.queue).run()
+    finally:
+        await dp.emit_shutdown(**workflow_data)
+        for bot in bots:
+            await bot.session.close()
+
+
+def create_bot(
+        token: str,
+        session: Union[None, BaseSession] = None,
+        pacing: bool = True
+) -> Bot:
+    """Creates a bot with the app's session middlewares; without
+    ``pacing`` outgoing calls skip the outbound rate limiter.
+    """
+    bot = Bot(
+        token=token,
+        session=session or FrozenMarkupSession(),
+        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
+    )
+    if pacing:
+        bot.session.middleware(OUTBOUND_SCHEDULER)
+    if CONFIG.metrics.enabled:
+        bot.session.middleware(API_METRICS)
+    return bot
+
 
+async def build_dispatcher(
+        db: Redis,
+        bots: list[Bot],
+        bot_data: BotDataRegistry,
+        user_service: UserService,
+        newsletter_service: NewsletterService,
+        timer_service: TimerService,
+        update_middlewares: Iterable[BaseMiddleware] = (),
+        fsm_db: Union[None, Redis] = None
+) -> Dispatcher:
+    """Builds the dispatcher with all middlewares and handlers of the app.
+
+    ``update_middlewares`` run before the FSM context, its chat locks
+    and the app's own update middlewares.
+    FSM storage and chat locks use ``fsm_db`` when given, so they never
+    wait for connections held by the services.
+    """
+    fsm_db = fsm_db or db
     dp = Dispatcher(
-        events_isolation=SimpleEventIsolation(),
-        storage=RedisStorage(
-            redis=db,
+        events_isolation=DistributedEventIsolation(fsm_db, CONFIG.isolation),
+        storage=HashRedisStorage(
+            redis=fsm_db,
             key_builder=DefaultKeyBuilder(with_destiny=True)
         )
     )
-    dp.message.middleware.register(ServicesProviderMiddleware(db))
+    if CONFIG.metrics.enabled:
+        dp.update.outer_middleware.register(UpdateMetricsMiddleware())
+        dp.update.outer_middleware.register(TracingMiddleware())
+    # ahead of the FSM context, so updates the stream ingest only hands
+    # on never read the state or take a chat lock
+    dp.update.outer_middleware.unregister(dp.fsm)
+    for middleware in update_middlewares:
+        dp.update.outer_middleware.register(middleware)
+    dp.update.outer_middleware.register(dp.fsm)
+
+    bot_contexts = await build_bot_contexts(
+        bots=bots,
+        user_service=user_service
+    )
+    dp.update.outer_middleware.register(
+        BotContextMiddleware(bot_contexts, bot_data))
+    dp.update.outer_middleware.register(CachedStateMiddleware())
+    dp.message.outer_middleware.register(OutboundPriorityMiddleware())
     dp.message.middleware.register(ChatThreadFilterMiddleware())
     dp.message.middleware.register(BannedMiddleware())
-    dp.message.outer_middleware.register(DynamicDataProviderMiddleware())
+    dp['newsletter_service'] = newsletter_service
+    dp['timer_service'] = timer_service
     dp.startup.register(on_startup)
 
     register_handlers(dp)
+    if CONFIG.metrics.enabled:
+        instrument_dispatcher(dp)
+    return dp
 
-    bots = []
-    for b_data in CONFIG.bots.values():
-        if check_bot_token(b_data.id) and b_data.enabled:
-            bots.append(
-                Bot(
-                    token=dotenv.dotenv_values().get(
-                        BOT_TOKEN_FORMAT.format(b_data.id)
-                    ),
-                    default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
-                )
-            )
 
-    for bot in bots:
-        await bot.get_updates(offset=-1)
-    await dp.start_polling(*bots)
+async def start_app():
+    timer = StartupTimer()
+    with timer.phase('config'):
+        CONFIG.load()
+        LOG_PIPELINE.configure(
+            path=CONFIG.logging.path,
+            level=CONFIG.logging.level,
+            json_format=CONFIG.logging.json,
+            rotation=CONFIG.logging.rotation,
+            max_bytes=CONFIG.logging.max_bytes,
+            backup_count=CONFIG.logging.backup_count,
+            sampling=CONFIG.logging.sampling,
+            levels=CONFIG.logging.levels
+        )
+        LOGGER.info('start application')
+        bot_ids = [b.id for b in CONFIG.bots.values()
+                   if check_bot_token(b.id) and b.enabled]
+        if CONFIG.queue.role == 'worker' and CONFIG.redis.socket_timeout \
+                and CONFIG.redis.socket_timeout * 1000 <= CONFIG.queue.block:
+            raise RuntimeError(
+                'Redis.socket_timeout must be longer than Queue.block')
+    with timer.phase('redis'):
+        db = fsm_db = get_db_instance()
+        if CONFIG.redis.fsm_max_connections:
+            fsm_db = get_db_instance(CONFIG.redis.fsm_max_connections)
+        pools = {'service': db, 'fsm': fsm_db} if fsm_db is not db \
+            else {'service': db}
+        await asyncio.gather(*(test_connection(client)
+                               for client in pools.values()))
+
+    OUTBOUND_SCHEDULER.bind(CONFIG.outbound)
+    ADMIN_ROSTER.bind(
+        ttl=CONFIG.admin_cache.ttl,
+        db=db if CONFIG.admin_cache.shared else None
+    )
+    if CONFIG.metrics.enabled:
+        TRACER.configure(CONFIG.tracing)
+    elif CONFIG.tracing.enabled:
+        # spans come from the metrics hooks, switched by the metrics server
+        LOGGER.warning('Tracing is enabled but Metrics is not, '
+                       'updates are not traced')
+    ban_cache = BanCache(db, bot_ids)
+    newsletter_service = NewsletterService(db, CONFIG.newsletter)
+    timer_service = TimerService(db, CONFIG.timers)
+    offsets = UpdateOffsetMiddleware(db, CONFIG.updates)
+    bot_data = BotDataRegistry(CONFIG.bot_data)
+    state_loads = [
+        migrate_banned_lists(db, bot_ids),
+        asyncio.to_thread(bot_data.load)
+    ]
+    if CONFIG.queue.role != 'worker':
+        state_loads.append(offsets.load(bot_ids))
+    with timer.phase('state'):
+        await asyncio.gather(*state_loads)
+    ban_cache_task = asyncio.create_task(ban_cache.listen())
+    bot_data_task = asyncio.create_task(bot_data.watch())
+
+    offsets_task = None
+    update_middlewares = []
+    if CONFIG.queue.role != 'worker':
+        offsets_task = asyncio.create_task(offsets.run())
+        update_middlewares.append(offsets)
+    capture = None
+    if CONFIG.capture.enabled and CONFIG.queue.role != 'worker':
+        salt = get_env('CAPTURE_SALT')
+        if not salt:
+            LOGGER.warning('CAPTURE_SALT is not set, using a random salt')
+            salt = secrets.token_hex(32)
+        kept_ids = [id_ for b_data in CONFIG.bots.values()
+                    for id_ in (b_data.id, b_data.admin_chat_id)]
+        capture = UpdateCapture(CONFIG.capture, salt.encode(), kept_ids)
+        capture.start()
+        update_middlewares.append(capture)
+    if CONFIG.queue.role == 'ingest':
+        update_middlewares.append(StreamIngestMiddleware(db, CONFIG.queue))
+
+    with timer.phase('bots'):
+        bots = [create_bot(get_env(BOT_TOKEN_FORMAT.format(bot_id)))
+                for bot_id in bot_ids]
+        dp = await build_dispatcher(
+            db=db,
+            bots=bots,
+            bot_data=bot_data,
+            user_service=UserService(db, ban_cache),
+            newsletter_service=newsletter_service,
+            timer_service=timer_service,
+            update_middlewares=update_middlewares,
+            fsm_db=fsm_db
+        )
+    dp.startup.register(timer.report)
+
+    metrics_runner = None
+    if CONFIG.metrics.enabled:
+        register_stats('startup', lambda: timer.stats)
+        register_stats('redis_pool', lambda: {
+            name: client.connection_pool.stats
+            for name, client in pools.items()
+        })
+        register_stats('admin_roster', lambda: ADMIN_ROSTER.stats)
+        register_stats('outbound', lambda: OUTBOUND_SCHEDULER.stats)
+        register_stats('isolation', lambda: dp.fsm.events_isolation.stats)
+        register_stats('background_tasks', lambda: {
+            'pending': BACKGROUND_TASKS.pending,
+            'failed': BACKGROUND_TASKS.failed
+        })
+        register_stats('timers', lambda: {
+            'executed': timer_service.executed})
+        register_stats('bot_data', lambda: {'reloads': bot_data.reloads})
+        register_stats('tracing', lambda: TRACER.stats)
+        if capture:
+            register_stats('capture', lambda: {
+                'captured': capture.captured})
+        with timer.phase('metrics'):
+            metrics_runner = await start_metrics_server(CONFIG.metrics)
+
+    timer_task = None
+    if CONFIG.queue.role != 'ingest':
+        timer_task = asyncio.create_task(timer_service.run(bots))
+    try:
+        if CONFIG.queue.role == 'worker':
+            await start_worker(db, dp, bots)
+        elif CONFIG.app.mode == 'webhook':
+            await start_webhook(dp, bots)
+        else:
+            with timer.phase('updates'):
+                await prepare_polling(dp, bots, offsets, CONFIG.updates)
+            await dp.start_polling(*bots)
+    finally:
+        if offsets_task:
+            offsets_task.cancel()
+            await offsets.flush()
+        ban_cache_task.cancel()
+        bot_data_task.cancel()
+        if timer_task:
+            timer_task.cancel()
+        await newsletter_service.stop()
+        await BACKGROUND_TASKS.drain()
+        if capture:
+            capture.stop()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        for client in pools.values():
+            await client.aclose()
@@ -0,0 +1,163 @@
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Union
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the metrics rendered in the Prometheus text format."""
+    type = 'untyped'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples():
+            if labels:
+                text = ','.join(f'{label}="{escape_label(str(label_value))}"'
+                                for label, label_value in labels.items())
+                name = f'{name}{{{text}}}'
+            lines.append(f'{name} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.__values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in self.__values.items():
+            yield f'{self.name}_total', dict(zip(self.labels, key)), value
+
+
+class Gauge(Metric):
+    """Reads its values from ``callback`` on every scrape; it returns
+    a number or a mapping of label value tuples to numbers.
+    """
+    type = 'gauge'
+
+    def __init__(
+            self,
+            *args,
+            callback: Callable[[], Union[float, dict]],
+            **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+
+    def samples(self) -> Iterator[Sample]:
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+            self,
+            *args,
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+            **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        # label values -> [count per bucket incl. +Inf, sum]
+        self.__values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if not (entry := self.__values.get(key)):
+            entry = self.__values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, (counts, total) in self.__values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       {**labels, 'le': format_value(bound)}, cumulative)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.__metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str,
+                  labels: tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str,
+              callback: Callable[[], Union[float, dict]],
+              labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(
+            Gauge(name, documentation, labels, callback=callback))
+
+    def render(self) -> str:
+        return '\n'.join(
+            metric.render() for metric in self.__metrics.values()) + '\n'
+
+
+METRICS = MetricsRegistry()
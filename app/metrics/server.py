@@ -0,0 +1,73 @@
+from typing import Union
+
+from aiohttp import web
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+from app.metrics.registry import METRICS
+from app.metrics.tracing import TRACER
+
+LOGGER = get_logger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+TRACING_PATH = '/tracing'
+
+
+async def metrics_handler(_: web.Request) -> web.Response:
+    return web.Response(body=METRICS.render().encode(),
+                        headers={'Content-Type': CONTENT_TYPE})
+
+
+def parse_bool(value: Union[None, str]) -> Union[None, bool]:
+    if value is None:
+        return None
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f'{value!r} is not a boolean')
+
+
+def parse_float(value: Union[None, str]) -> Union[None, float]:
+    return None if value is None else float(value)
+
+
+async def tracing_handler(request: web.Request) -> web.Response:
+    """``GET`` shows the tracing switches, ``POST`` changes those given
+    in the query, e.g. ``?enabled=true&sample_rate=0.1``.
+    """
+    if request.method == 'POST':
+        query = request.query
+        try:
+            TRACER.set(
+                enabled=parse_bool(query.get('enabled')),
+                sample_rate=parse_float(query.get('sample_rate')),
+                slow_threshold=parse_float(query.get('slow_threshold')),
+                profile=parse_bool(query.get('profile'))
+            )
+        except ValueError as exc:
+            raise web.HTTPBadRequest(text=str(exc))
+    return web.json_response(TRACER.stats)
+
+
+async def start_metrics_server(
+        settings: Config.Metrics
+) -> Union[None, web.AppRunner]:
+    """Serves the metrics in the background; a busy port is logged and
+    doesn't stop the bot.
+    """
+    app = web.Application()
+    app.router.add_get(settings.path, metrics_handler)
+    app.router.add_get(TRACING_PATH, tracing_handler)
+    app.router.add_post(TRACING_PATH, tracing_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.host, settings.port)
+    try:
+        await site.start()
+    except OSError as exc:
+        LOGGER.error('metrics server not started: %s', exc)
+        await runner.cleanup()
+        return None
+    LOGGER.info('metrics served on %s%s', site.name, settings.path)
+    return runner
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Union
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.configuration.config_loader import Config
+from app.configuration.log import SLOW_LOGGER, get_logger
+
+LOGGER = get_logger(__name__)
+SLOW_LOG = logging.getLogger(SLOW_LOGGER)
+
+PROFILE_LINES = 30
+
+
+class Span:
+    __slots__ = ('kind', 'name', 'trace', 'started_at', 'duration',
+                 'children')
+
+    def __init__(self, kind: str, name: str, trace: 'Trace') -> None:
+        self.kind = kind
+        self.name = name
+        self.trace = trace
+        self.started_at = time.perf_counter()
+        self.duration: Union[None, float] = None
+        self.children: list[Span] = []
+
+    def render(self, depth: int = 0) -> Iterator[str]:
+        duration = 'unfinished' if self.duration is None \
+            else f'{self.duration * 1000:.2f} ms'
+        offset = (self.started_at - self.trace.root.started_at) * 1000
+        yield f'{"  " * depth}{self.kind} {self.name}: {duration} ' \
+              f'(+{offset:.2f} ms)'
+        for child in self.children:
+            yield from child.render(depth + 1)
+
+
+class Trace:
+    def __init__(self, name: str, max_spans: int) -> None:
+        self.max_spans = max_spans
+        self.spans = 1
+        self.dropped = 0
+        self.root = Span('update', name, self)
+
+    def render(self) -> str:
+        lines = list(self.root.render())
+        if self.dropped:
+            lines.append(f'{self.dropped} more spans not recorded')
+        return '\n'.join(lines)
+
+
+CURRENT_SPAN: ContextVar[Union[None, Span]] = ContextVar(
+    'current_span', default=None
+)
+
+
+@contextmanager
+def trace_span(kind: str, name: str) -> Iterator[Union[None, Span]]:
+    """Records a child of the current span; a no-op outside of a
+    sampled update.
+    """
+    if (parent := CURRENT_SPAN.get()) is None:
+        yield None
+        return
+    trace = parent.trace
+    if trace.spans >= trace.max_spans:
+        trace.dropped += 1
+        yield None
+        return
+    trace.spans += 1
+    span = Span(kind, name, trace)
+    parent.children.append(span)
+    token = CURRENT_SPAN.set(span)
+    try:
+        yield span
+    finally:
+        span.duration = time.perf_counter() - span.started_at
+        CURRENT_SPAN.reset(token)
+
+
+class Tracer:
+    """Runtime switches of the tracing; changed through the metrics
+    server while the bot is running.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.slow_threshold = 1.0
+        self.profile = False
+        self.max_spans = 1000
+        self.traced = 0
+        self.slow = 0
+        self.__profiling = False
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_threshold': self.slow_threshold,
+            'profile': self.profile,
+            'traced': self.traced,
+            'slow': self.slow
+        }
+
+    def configure(self, settings: Config.Tracing) -> None:
+        self.set(enabled=settings.enabled,
+                 sample_rate=settings.sample_rate,
+                 slow_threshold=settings.slow_threshold,
+                 profile=settings.profile)
+        self.max_spans = settings.max_spans
+
+    def set(
+            self,
+            enabled: Union[None, bool] = None,
+            sample_rate: Union[None, float] = None,
+            slow_threshold: Union[None, float] = None,
+            profile: Union[None, bool] = None
+    ) -> None:
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be between 0 and 1')
+        if slow_threshold is not None and slow_threshold < 0:
+            raise ValueError('slow_threshold must not be negative')
+        for name, value in (('enabled', enabled),
+                            ('sample_rate', sample_rate),
+                            ('slow_threshold', slow_threshold),
+                            ('profile', profile)):
+            if value is not None:
+                setattr(self, name, value)
+        LOGGER.info('tracing set to %s', self.stats)
+
+    def sampled(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    @contextmanager
+    def profiler(self) -> Iterator[Union[None, cProfile.Profile]]:
+        """Only one profiler can run at a time, concurrent sampled
+        updates go without one. The profile covers everything the event
+        loop runs meanwhile, not only the traced update.
+        """
+        if not self.profile or self.__profiling:
+            yield None
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as exc:  # another profiler is active
+            LOGGER.warning('update not profiled: %s', exc)
+            yield None
+            return
+        self.__profiling = True
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            self.__profiling = False
+
+    def report(self, trace: Trace,
+               profiler: Union[None, cProfile.Profile]) -> None:
+        self.slow += 1
+        text = trace.render()
+        if profiler:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream) \
+                .sort_stats(pstats.SortKey.CUMULATIVE) \
+                .print_stats(PROFILE_LINES)
+            text = f'{text}\n{stream.getvalue()}'
+        SLOW_LOG.warning('slow %s\n%s', trace.root.name, text)
+
+
+TRACER = Tracer()
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Traces a sampled share of updates; the span tree of an update
+    slower than ``slow_threshold`` goes to the slow log.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not TRACER.sampled():
+            return await handler(event, data)
+        TRACER.traced += 1
+        trace = Trace(f'{event.event_type} {event.update_id} of bot '
+                      f'{data["bot"].id}', TRACER.max_spans)
+        token = CURRENT_SPAN.set(trace.root)
+        profiler = None
+        try:
+            with TRACER.profiler() as profiler:
+                return await handler(event, data)
+        finally:
+            CURRENT_SPAN.reset(token)
+            trace.root.duration = time.perf_counter() - \
+                trace.root.started_at
+            if trace.root.duration >= TRACER.slow_threshold:
+                TRACER.report(trace, profiler)
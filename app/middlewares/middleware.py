@@ -1,29 +1,53 @@
-import os
-from typing import Any, Awaitable, Callable, Dict, Union
+from typing import Any, Awaitable, Callable, Dict, Mapping, Union
 
 from aiogram import BaseMiddleware, Bot
 from aiogram.enums import ChatType
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from redis.asyncio.client import Redis
 
-from app.configuration.config_loader import CONFIG
+from app.configuration.bot_context import BotContext
+from app.configuration.bot_data import BotDataRegistry
+from app.db.storage import CachedFSMContext
 from app.services.user_service import UserService
 
 
-class DynamicDataProviderMiddleware(BaseMiddleware):
+class BotContextMiddleware(BaseMiddleware):
     async def __call__(
             self, handler: Callable[
                 [TelegramObject, Dict[str, Any]], Awaitable[Any]],
             event: TelegramObject,
             data: Dict[str, Any]
     ) -> Any:
-        bot: Bot = data['bot']
-        data["dynamic_data"] = self.dynamic_data.get(bot.id, {})
+        bot_context = self.bot_contexts[data['bot'].id]
+        data["bot_context"] = bot_context
+        data["bot_data"] = self.bot_data.get(bot_context.id)
+        data["user_service"] = bot_context.user_service
         return await handler(event, data)
 
-    def __init__(self):
-        self.dynamic_data = CONFIG.read_yaml(
-            file_path=os.path.relpath('bot_data.yaml'))
+    def __init__(
+            self,
+            bot_contexts: Mapping[int, BotContext],
+            bot_data: BotDataRegistry
+    ):
+        self.bot_contexts = bot_contexts
+        self.bot_data = bot_data
+
+
+class CachedStateMiddleware(BaseMiddleware):
+    """Replaces the update's ``state`` with a context caching its data.
+
+    Must be registered after the dispatcher's own FSM middleware.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if state := data.get('state'):
+            data['state'] = CachedFSMContext(storage=state.storage,
+                                             key=state.key)
+        return await handler(event, data)
 
 
 class ChatThreadFilterMiddleware(BaseMiddleware):
@@ -34,10 +58,10 @@ class ChatThreadFilterMiddleware(BaseMiddleware):
             data: Dict[str, Any]
     ) -> Any:
         if event.chat.type == ChatType.SUPERGROUP:
-            bot: Bot = data['bot']
+            bot_context: BotContext = data['bot_context']
             if thread_id := event.message_thread_id:
-                if CONFIG.bots[bot.id].thread_id == thread_id or not \
-                        CONFIG.bots[bot.id].thread_id:
+                if bot_context.thread_id == thread_id or not \
+                        bot_context.thread_id:
                     return await handler(event, data)
         else:
             return await handler(event, data)
@@ -57,20 +81,6 @@ class DataProviderMiddleware(BaseMiddleware):
         self.bot_data = bot_data
 
 
-class ServicesProviderMiddleware(BaseMiddleware):
-    async def __call__(
-            self, handler: Callable[
-                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
-            event: TelegramObject,
-            data: Dict[str, Any]
-    ) -> Any:
-        data["user_service"] = UserService(self.db)
-        return await handler(event, data)
-
-    def __init__(self, db: Redis):
-        self.db = db
-
-
 class BannedMiddleware(BaseMiddleware):
     async def __call__(
             self, handler: Callable[
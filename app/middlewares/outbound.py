@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Iterator, Union
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    BULK = 2
+
+
+OUTBOUND_PRIORITY: ContextVar[Priority] = ContextVar(
+    'outbound_priority', default=Priority.NORMAL
+)
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    """Sets the priority of Bot API calls made inside the block."""
+    token = OUTBOUND_PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        OUTBOUND_PRIORITY.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def take(self) -> float:
+        """Takes a token if one is available.
+
+        :return: 0 on success, otherwise seconds until a token is available
+        """
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class PriorityTokenBucket(TokenBucket):
+    """Token bucket whose waiters are served in ``Priority`` order."""
+    __slots__ = ('waiters', 'pump', 'counter')
+
+    def __init__(self, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.pump: Union[None, asyncio.Task] = None
+        self.counter = itertools.count()
+
+    async def acquire(self, priority: Priority) -> None:
+        if not self.waiters and not self.take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        if not self.pump or self.pump.done():
+            self.pump = asyncio.create_task(self.__pump())
+        await future
+
+    async def __pump(self) -> None:
+        while self.waiters:
+            if delay := self.take():
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                self.give_back()
+            else:
+                future.set_result(None)
+
+
+class OutboundSchedulerMiddleware(BaseRequestMiddleware):
+    """Paces outgoing Bot API calls to stay within Telegram limits.
+
+    Calls addressed to a chat take a token from the per-chat bucket
+    (private chats and groups have different limits) and then from the
+    per-bot global bucket, where waiters are served by priority. Calls
+    that still hit flood control are retried after ``retry_after``.
+    """
+
+    def __init__(self, settings: Union[None, Config.Outbound] = None):
+        self.settings = settings or Config.Outbound()
+        self.__global: dict[int, PriorityTokenBucket] = {}
+        self.__chats: OrderedDict[tuple[int, int], TokenBucket] = OrderedDict()
+        self.__chat_waiters = 0
+
+    def bind(self, settings: Config.Outbound) -> None:
+        self.settings = settings
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            'global_waiters': {
+                bot_id: len(bucket.waiters)
+                for bot_id, bucket in self.__global.items()
+            },
+            'chat_waiters': self.__chat_waiters,
+            'chat_buckets': len(self.__chats)
+        }
+
+    def __get_global_bucket(self, bot_id: int) -> PriorityTokenBucket:
+        if not (bucket := self.__global.get(bot_id)):
+            bucket = self.__global[bot_id] = PriorityTokenBucket(
+                rate=self.settings.global_rate,
+                capacity=self.settings.global_rate
+            )
+        return bucket
+
+    def __get_chat_bucket(self, bot_id: int, chat_id: int) -> TokenBucket:
+        key = (bot_id, chat_id)
+        if bucket := self.__chats.get(key):
+            self.__chats.move_to_end(key)
+            return bucket
+        if chat_id > 0:
+            bucket = TokenBucket(
+                rate=self.settings.private_rate,
+                capacity=self.settings.private_burst
+            )
+        else:
+            bucket = TokenBucket(
+                rate=self.settings.group_rate / 60,
+                capacity=self.settings.group_burst
+            )
+        self.__chats[key] = bucket
+        if len(self.__chats) > self.settings.max_chat_buckets:
+            self.__chats.popitem(last=False)
+        return bucket
+
+    async def __acquire(self, bot_id: int, chat_id: Union[None, int]) -> None:
+        if isinstance(chat_id, int):
+            chat_bucket = self.__get_chat_bucket(bot_id, chat_id)
+            self.__chat_waiters += 1
+            try:
+                while delay := chat_bucket.take():
+                    await asyncio.sleep(delay)
+            finally:
+                self.__chat_waiters -= 1
+        await self.__get_global_bucket(bot_id).acquire(OUTBOUND_PRIORITY.get())
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        if not hasattr(method, 'chat_id') or \
+                type(method).__name__.startswith('Get'):
+            return await make_request(bot, method)
+
+        chat_id = method.chat_id
+        for attempt in itertools.count(1):
+            await self.__acquire(bot.id, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                if attempt > self.settings.max_retries:
+                    raise
+                LOGGER.warning(
+                    'flood control on %s in chat %s, retry in %s sec',
+                    type(method).__name__, chat_id, exc.retry_after
+                )
+                if isinstance(chat_id, int):
+                    self.__get_chat_bucket(bot.id, chat_id).block(
+                        exc.retry_after)
+                else:
+                    await asyncio.sleep(exc.retry_after)
+
+
+class OutboundPriorityMiddleware(BaseMiddleware):
+    """Gives Bot API calls made while handling admin chat messages
+    priority over regular and bulk traffic.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if event.chat.id == data['bot_context'].admin_chat_id:
+            with outbound_priority(Priority.HIGH):
+                return await handler(event, data)
+        return await handler(event, data)
+
+
+OUTBOUND_SCHEDULER = OutboundSchedulerMiddleware()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Union
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+from redis.asyncio import Redis
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+UPDATES_OFFSET_KEY = 'updates:{bot_id}:offset'
+# Telegram may restart update ids after a week without updates.
+UPDATES_OFFSET_TTL = 7 * 24 * 3600
+
+
+def get_update_timestamp(update: Update) -> Union[None, float]:
+    """When the update was produced, if Telegram tells it."""
+    event = update.event
+    date = getattr(event, 'date', None) or getattr(
+        getattr(event, 'message', None), 'date', None)
+    return date.timestamp() if date else None
+
+
+class UpdateOffsetMiddleware(BaseMiddleware):
+    """Outer update middleware keeping the handled offset of every bot.
+
+    The offset is the highest ``update_id`` such that it and all updates
+    before it were handled. It is saved to Redis every
+    ``flush_interval`` seconds, so after a restart updates Telegram
+    delivers again (received but not yet confirmed by the last
+    ``get_updates``) are skipped instead of being handled twice.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        bot_id = data['bot'].id
+        if event.update_id <= self.__saved.get(bot_id, 0):
+            LOGGER.debug('skip update %s of bot %s, already handled',
+                         event.update_id, bot_id)
+            return None
+        in_flight = self.__in_flight.setdefault(bot_id, set())
+        in_flight.add(event.update_id)
+        self.__seen[bot_id] = max(self.__seen.get(bot_id, 0),
+                                  event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            in_flight.discard(event.update_id)
+            self.__handled[bot_id] = (
+                min(in_flight) - 1 if in_flight else self.__seen[bot_id]
+            )
+
+    def __init__(self, db: Redis, settings: Config.Updates):
+        self.db = db
+        self.settings = settings
+        self.__saved: dict[int, int] = {}
+        self.__handled: dict[int, int] = {}
+        self.__seen: dict[int, int] = {}
+        self.__in_flight: dict[int, set[int]] = {}
+
+    def get(self, bot_id: int) -> int:
+        return self.__saved.get(bot_id, 0)
+
+    async def load(self, bot_ids: list[int]) -> None:
+        offsets = await self.db.mget([
+            UPDATES_OFFSET_KEY.format(bot_id=bot_id) for bot_id in bot_ids
+        ])
+        self.__saved = {
+            bot_id: int(offset)
+            for bot_id, offset in zip(bot_ids, offsets) if offset
+        }
+        LOGGER.debug('loaded update offsets %s', self.__saved)
+
+    async def flush(self) -> None:
+        changed = {
+            bot_id: offset for bot_id, offset in self.__handled.items()
+            if offset > self.__saved.get(bot_id, 0)
+        }
+        if not changed:
+            return
+        async with self.db.pipeline(transaction=False) as pipe:
+            for bot_id, offset in changed.items():
+                pipe.set(UPDATES_OFFSET_KEY.format(bot_id=bot_id), offset,
+                         ex=UPDATES_OFFSET_TTL)
+            await pipe.execute()
+        self.__saved.update(changed)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error('update offsets not saved: %s', exc)
+
+
+async def catch_up(
+        dp: Dispatcher,
+        bot: Bot,
+        offsets: UpdateOffsetMiddleware,
+        settings: Config.Updates
+) -> None:
+    """Drains the backlog of a bot before regular polling starts.
+
+    Pending updates are fetched in batches of ``settings.batch`` without
+    long polling and handled up to ``settings.concurrency`` at a time;
+    updates older than ``settings.max_age`` seconds are skipped. Updates
+    of one chat still run in order thanks to the events isolation.
+    """
+    allowed_updates = dp.resolve_used_update_types()
+    offset = offsets.get(bot.id) + 1 if offsets.get(bot.id) else None
+    semaphore = asyncio.Semaphore(settings.concurrency)
+    tasks: set[asyncio.Task] = set()
+    handled = skipped = 0
+    started_at = time.monotonic()
+
+    async def feed(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.exception('backlog update %s of bot %s failed: %s',
+                             update.update_id, bot.id, exc)
+        finally:
+            semaphore.release()
+
+    while updates := await bot.get_updates(
+            offset=offset,
+            limit=settings.batch,
+            timeout=0,
+            allowed_updates=allowed_updates
+    ):
+        cutoff = time.time() - settings.max_age
+        for update in updates:
+            offset = update.update_id + 1
+            timestamp = get_update_timestamp(update)
+            if settings.max_age and timestamp and timestamp < cutoff:
+                skipped += 1
+                continue
+            await semaphore.acquire()
+            task = asyncio.create_task(feed(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            handled += 1
+    await asyncio.gather(*tasks)
+    await offsets.flush()
+    if handled or skipped:
+        LOGGER.info('bot %s caught up on %d updates (%d too old) in %.1fs',
+                    bot.id, handled, skipped, time.monotonic() - started_at)
+
+
+async def prepare_polling(
+        dp: Dispatcher,
+        bots: list[Bot],
+        offsets: UpdateOffsetMiddleware,
+        settings: Config.Updates
+) -> None:
+    if settings.drop_pending:
+        await asyncio.gather(*(bot.get_updates(offset=-1) for bot in bots))
+    elif settings.catch_up:
+        await asyncio.gather(*(
+            catch_up(dp, bot, offsets, settings) for bot in bots
+        ))
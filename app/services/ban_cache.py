@@ -0,0 +1,84 @@
+import asyncio
+from typing import Iterable, Union
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+BANNED_KEY = 'banned:{bot_id}'
+BANNED_EVENTS_CHANNEL = 'banned:events'
+
+RECONNECT_DELAY = 5  # sec
+SUBSCRIPTION_READ_TIMEOUT = 5  # sec
+
+
+class BanCache:
+    """Process-local mirror of the ``banned:{bot_id}`` sets.
+
+    Every ban/unban is published on ``BANNED_EVENTS_CHANNEL`` as
+    ``"<bot_id>:<+|-><user_id>"``, so each process applies the same delta
+    to its copy. While the subscription is down the cache is dropped and
+    ``get`` returns ``None``, letting callers fall back to ``SISMEMBER``.
+    """
+
+    def __init__(self, db: Redis, bot_ids: Iterable[int]):
+        self.db = db
+        self.bot_ids = list(bot_ids)
+        self.__banned: dict[int, set[int]] = {}
+
+    def get(self, bot_id: int) -> Union[None, set[int]]:
+        return self.__banned.get(bot_id)
+
+    @staticmethod
+    def format_event(bot_id: int, user_id: int, banned: bool) -> str:
+        return f'{bot_id}:{"+" if banned else "-"}{user_id}'
+
+    def apply_event(self, event: Union[bytes, str]) -> None:
+        if isinstance(event, bytes):
+            event = event.decode()
+        bot_id, change = event.split(':', 1)
+        if (banned := self.__banned.get(int(bot_id))) is None:
+            return
+        if change[0] == '+':
+            banned.add(int(change[1:]))
+        else:
+            banned.discard(int(change[1:]))
+
+    async def warm(self) -> None:
+        for bot_id in self.bot_ids:
+            members = await self.db.smembers(BANNED_KEY.format(bot_id=bot_id))
+            self.__banned[bot_id] = set(map(int, members))
+            LOGGER.debug('ban cache for bot %s warmed (%d users)',
+                         bot_id, len(members))
+
+    def clear(self) -> None:
+        self.__banned.clear()
+
+    async def listen(self) -> None:
+        """Keeps the cache coherent until cancelled.
+
+        The channel is subscribed before the sets are loaded, so no change
+        made in between can be missed.
+        """
+        while True:
+            pubsub = self.db.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(BANNED_EVENTS_CHANNEL)
+                await self.warm()
+                while True:
+                    # a bounded read instead of listen(): the socket
+                    # timeout of the pool does not apply to idle waits,
+                    # and health checks still run between reads
+                    message = await pubsub.get_message(
+                        timeout=SUBSCRIPTION_READ_TIMEOUT)
+                    if message and message['type'] == 'message':
+                        self.apply_event(message['data'])
+            except (RedisError, OSError) as exc:
+                LOGGER.error('ban cache subscription lost: %s', exc)
+            finally:
+                self.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(RECONNECT_DELAY)
@@ -0,0 +1,295 @@
+import asyncio
+import time
+import uuid
+from contextlib import suppress
+from enum import Enum
+from typing import Union
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError
+)
+from redis.asyncio import Redis
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+from app.db.database import RELEASE_LEASE_SCRIPT, RENEW_LEASE_SCRIPT
+from app.keyboards.keyboard import get_newsletter_keyboard
+from app.middlewares.outbound import outbound_priority, Priority
+from app.services.user_service import USERS_KEY
+
+LOGGER = get_logger(__name__)
+
+NEWSLETTER_KEY = 'newsletter:{bot_id}'
+NEWSLETTER_BATCH_KEY = 'newsletter:{bot_id}:batch'
+NEWSLETTER_LOCK_KEY = 'newsletter:{bot_id}:lock'
+
+# Moves the checkpoint past a finished batch and forgets its
+# delivered ids in one step, so a restart never resends them.
+COMMIT_BATCH_SCRIPT = """
+redis.call('HSET', KEYS[1], 'cursor', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'sent', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'failed', ARGV[3])
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+
+class NewsletterStatus(str, Enum):
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    CANCELLED = 'cancelled'
+    DONE = 'done'
+
+
+class NewsletterService:
+    """Broadcasts a message to every user of a bot.
+
+    Recipients are read from the ``users:{bot_id}`` sorted set (scored by
+    user id) in batches, so the audience is never loaded into memory.
+    After each batch the last user id is stored as a checkpoint; ids
+    delivered inside the current batch are kept in a set, which makes
+    a resumed broadcast skip them. The runner holds a lease renewed in
+    the background, so only one process works on a bot's newsletter at
+    a time; a run started while the lease of a crashed one is still
+    alive waits for it to expire.
+    """
+
+    def __init__(self, db: Redis, settings: Config.Newsletter):
+        self.db = db
+        self.settings = settings
+        self.__tasks: dict[int, asyncio.Task] = {}
+        self.__commit_batch = db.register_script(COMMIT_BATCH_SCRIPT)
+        self.__renew_lease = db.register_script(RENEW_LEASE_SCRIPT)
+        self.__release_lease = db.register_script(RELEASE_LEASE_SCRIPT)
+
+    async def get_progress(self, bot_id: int) -> dict[str, str]:
+        data = await self.db.hgetall(NEWSLETTER_KEY.format(bot_id=bot_id))
+        return {k.decode(): v.decode() for k, v in data.items()}
+
+    async def start(
+            self,
+            bot: Bot,
+            from_chat_id: int,
+            message_id: int,
+            progress_chat_id: int,
+            progress_message_id: int
+    ) -> bool:
+        key = NEWSLETTER_KEY.format(bot_id=bot.id)
+        if await self.db.hget(key, 'status') in (
+                NewsletterStatus.RUNNING.value.encode(),
+                NewsletterStatus.PAUSED.value.encode()
+        ):
+            return False
+        total = await self.db.zcard(USERS_KEY.format(bot_id=bot.id))
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.delete(key, NEWSLETTER_BATCH_KEY.format(bot_id=bot.id))
+            pipe.hset(key, mapping={
+                'status': NewsletterStatus.RUNNING.value,
+                'from_chat_id': from_chat_id,
+                'message_id': message_id,
+                'progress_chat_id': progress_chat_id,
+                'progress_message_id': progress_message_id,
+                'cursor': 0,
+                'total': total,
+                'sent': 0,
+                'failed': 0,
+                'started_at': int(time.time())
+            })
+            await pipe.execute()
+        self.__spawn(bot)
+        return True
+
+    async def set_progress_message(
+            self,
+            bot_id: int,
+            chat_id: int,
+            message_id: int
+    ) -> None:
+        await self.db.hset(NEWSLETTER_KEY.format(bot_id=bot_id), mapping={
+            'progress_chat_id': chat_id,
+            'progress_message_id': message_id
+        })
+
+    async def set_status(self, bot: Bot, status: NewsletterStatus) -> bool:
+        key = NEWSLETTER_KEY.format(bot_id=bot.id)
+        if not (current := await self.db.hget(key, 'status')):
+            return False
+        current = NewsletterStatus(current.decode())
+        if current in (NewsletterStatus.CANCELLED, NewsletterStatus.DONE):
+            return False
+        await self.db.hset(key, 'status', status.value)
+        if status == NewsletterStatus.RUNNING:
+            self.__spawn(bot)
+        return True
+
+    async def resume(self, bot: Bot) -> None:
+        """Picks up a broadcast interrupted by a restart."""
+        status = await self.db.hget(NEWSLETTER_KEY.format(bot_id=bot.id),
+                                    'status')
+        if status == NewsletterStatus.RUNNING.value.encode():
+            LOGGER.info('resume newsletter of bot %s', bot.id)
+            self.__spawn(bot)
+
+    async def stop(self) -> None:
+        for task in self.__tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.__tasks.values(), return_exceptions=True)
+
+    def __spawn(self, bot: Bot) -> None:
+        if (task := self.__tasks.get(bot.id)) and not task.done():
+            return
+        self.__tasks[bot.id] = asyncio.create_task(self.__run(bot))
+
+    async def __run(self, bot: Bot) -> None:
+        lock_key = NEWSLETTER_LOCK_KEY.format(bot_id=bot.id)
+        if not (token := await self.__acquire(bot.id, lock_key)):
+            return
+        keeper = asyncio.create_task(self.__keep_lease(bot.id, lock_key,
+                                                       token))
+        try:
+            with outbound_priority(Priority.BULK):
+                await self.__broadcast(bot, keeper)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.exception('newsletter of bot %s failed: %s', bot.id, exc)
+        finally:
+            keeper.cancel()
+            await self.__release_lease(keys=[lock_key], args=[token])
+            await self.__report(bot)
+
+    async def __acquire(self, bot_id: int, lock_key: str) -> Union[None, str]:
+        """Takes the lease, waiting for a lease left by a crashed run to
+        expire; returns ``None`` once the newsletter is no longer running.
+        """
+        token = uuid.uuid4().hex
+        lease = self.settings.lease * 1000
+        while not await self.db.set(lock_key, token, nx=True, px=lease):
+            ttl = await self.db.pttl(lock_key)
+            LOGGER.info('newsletter of bot %s is leased by another process, '
+                        'retry in %d ms', bot_id, max(ttl, 0))
+            await asyncio.sleep((ttl if ttl > 0 else lease) / 1000)
+            status = await self.db.hget(NEWSLETTER_KEY.format(bot_id=bot_id),
+                                        'status')
+            if status != NewsletterStatus.RUNNING.value.encode():
+                return None
+        return token
+
+    async def __keep_lease(self, bot_id: int, lock_key: str,
+                           token: str) -> None:
+        """Renews the lease every third of its time; returns once it is
+        lost, which stops the broadcast before its next batch.
+        """
+        lease = self.settings.lease * 1000
+        while True:
+            await asyncio.sleep(lease / 3000)
+            if not await self.__renew_lease(keys=[lock_key],
+                                            args=[token, lease]):
+                LOGGER.warning('newsletter lease of bot %s lost', bot_id)
+                return
+
+    async def __broadcast(self, bot: Bot, keeper: asyncio.Task) -> None:
+        key = NEWSLETTER_KEY.format(bot_id=bot.id)
+        batch_key = NEWSLETTER_BATCH_KEY.format(bot_id=bot.id)
+        users_key = USERS_KEY.format(bot_id=bot.id)
+        reported_at = 0.0
+
+        while True:
+            if keeper.done():
+                return
+            progress = await self.get_progress(bot.id)
+            if progress.get('status') != NewsletterStatus.RUNNING.value:
+                return
+
+            user_ids = list(map(int, await self.db.zrangebyscore(
+                users_key, f'({progress["cursor"]}', '+inf',
+                start=0, num=self.settings.batch_size
+            )))
+            if not user_ids:
+                await self.db.hset(key, 'status', NewsletterStatus.DONE.value)
+                return
+
+            delivered = set(map(int, await self.db.smembers(batch_key)))
+            results = await self.__send_batch(
+                bot=bot,
+                user_ids=[u for u in user_ids if u not in delivered],
+                from_chat_id=int(progress['from_chat_id']),
+                message_id=int(progress['message_id']),
+                batch_key=batch_key
+            )
+            await self.__commit_batch(
+                keys=[key, batch_key],
+                args=[user_ids[-1], results.count(True) + len(delivered),
+                      results.count(False)]
+            )
+
+            if time.monotonic() - reported_at > \
+                    self.settings.progress_interval:
+                reported_at = time.monotonic()
+                await self.__report(bot)
+
+    async def __send_batch(
+            self,
+            bot: Bot,
+            user_ids: list[int],
+            from_chat_id: int,
+            message_id: int,
+            batch_key: str
+    ) -> list[bool]:
+        semaphore = asyncio.Semaphore(self.settings.concurrency)
+        users_key = USERS_KEY.format(bot_id=bot.id)
+
+        async def send(user_id: int) -> bool:
+            async with semaphore:
+                try:
+                    await bot.copy_message(
+                        chat_id=user_id,
+                        from_chat_id=from_chat_id,
+                        message_id=message_id
+                    )
+                except TelegramForbiddenError:
+                    # the user blocked the bot, don't try next time
+                    await self.db.zrem(users_key, user_id)
+                    return False
+                except TelegramAPIError as exc:
+                    LOGGER.warning('newsletter to %s failed: %s',
+                                   user_id, exc)
+                    return False
+                await self.db.sadd(batch_key, user_id)
+                return True
+
+        return await asyncio.gather(*(send(user_id) for user_id in user_ids))
+
+    async def __report(self, bot: Bot) -> None:
+        progress = await self.get_progress(bot.id)
+        if not progress:
+            return
+        with suppress(TelegramBadRequest):
+            await bot.edit_message_text(
+                text=format_progress(progress),
+                chat_id=int(progress['progress_chat_id']),
+                message_id=int(progress['progress_message_id']),
+                reply_markup=get_newsletter_keyboard(progress['status'])
+            )
+
+
+STATUS_TITLES = {
+    NewsletterStatus.RUNNING.value: 'идёт',
+    NewsletterStatus.PAUSED.value: 'на паузе',
+    NewsletterStatus.CANCELLED.value: 'отменена',
+    NewsletterStatus.DONE.value: 'завершена'
+}
+
+
+def format_progress(progress: dict[str, str]) -> str:
+    status = progress.get('status', '')
+    sent = int(progress.get('sent', 0))
+    failed = int(progress.get('failed', 0))
+    total = int(progress.get('total', 0)) or 1
+    return (
+        f'📨 Рассылка: *{STATUS_TITLES.get(status, status)}*\n\n'
+        f'Доставлено: {sent}\n'
+        f'Ошибок: {failed}\n'
+        f'Прогресс: {min(100, (sent + failed) * 100 // total)}%'
+    )
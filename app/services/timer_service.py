@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+import uuid
+from contextlib import suppress
+from enum import Enum
+from typing import Any, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from redis.asyncio import Redis
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+TIMERS_KEY = 'timers:{bot_id}'
+
+# Hides due jobs from other runners for the lease instead of removing
+# them, so a job claimed by a process that dies is picked up again.
+CLAIM_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                       'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], job)
+end
+return due
+"""
+
+
+class TimerAction(str, Enum):
+    SEND = 'send'
+    DELETE = 'delete'
+
+
+class TimerService:
+    """Deferred bot actions kept in the ``timers:{bot_id}`` sorted set.
+
+    Jobs are scored by their due time in ms, so they survive restarts
+    and handlers return right after scheduling. ``run`` claims due jobs
+    in batches and sleeps until the earliest one is due, at most
+    ``poll_interval`` seconds; a job scheduled earlier by this process
+    wakes it up at once. Several processes may run it on the same sets.
+    """
+
+    def __init__(self, db: Redis, settings: Config.Timers):
+        self.db = db
+        self.settings = settings
+        self.executed = 0
+        self.__claim_due = db.register_script(CLAIM_DUE_SCRIPT)
+        self.__wakeup = asyncio.Event()
+        self.__next_due = float('inf')
+
+    async def send_later(
+            self,
+            bot_id: int,
+            chat_id: int,
+            text: str,
+            delay: float
+    ) -> None:
+        await self.__schedule(bot_id, delay, action=TimerAction.SEND,
+                              chat_id=chat_id, text=text)
+
+    async def delete_later(
+            self,
+            bot_id: int,
+            chat_id: int,
+            message_id: int,
+            delay: float
+    ) -> None:
+        await self.__schedule(bot_id, delay, action=TimerAction.DELETE,
+                              chat_id=chat_id, message_id=message_id)
+
+    async def __schedule(self, bot_id: int, delay: float,
+                         **job: Any) -> None:
+        due = time.time() + delay
+        job['id'] = uuid.uuid4().hex
+        await self.db.zadd(TIMERS_KEY.format(bot_id=bot_id),
+                           {json.dumps(job): int(due * 1000)})
+        if due < self.__next_due:
+            self.__wakeup.set()
+
+    async def run(self, bots: list[Bot]) -> None:
+        while True:
+            try:
+                next_due = min((
+                    due for due in await asyncio.gather(*(
+                        self.run_due(bot) for bot in bots
+                    )) if due is not None
+                ), default=None)
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.error('timers not processed: %s', exc)
+                next_due = None
+            await self.__sleep(next_due)
+
+    async def __sleep(self, next_due: Union[None, float]) -> None:
+        timeout = self.settings.poll_interval
+        if next_due is not None:
+            timeout = min(timeout, max(0.0, next_due - time.time()))
+        self.__next_due = time.time() + timeout
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.__wakeup.wait(), timeout)
+        self.__wakeup.clear()
+        self.__next_due = float('inf')
+
+    async def run_due(self, bot: Bot) -> Union[None, float]:
+        """Runs due jobs of a bot and returns when the next one is due."""
+        key = TIMERS_KEY.format(bot_id=bot.id)
+        while jobs := await self.__claim_due(keys=[key], args=[
+            int(time.time() * 1000),
+            self.settings.batch,
+            int((time.time() + self.settings.lease) * 1000)
+        ]):
+            done = await asyncio.gather(*(
+                self.__execute(bot, json.loads(job)) for job in jobs
+            ))
+            if finished := [job for job, ok in zip(jobs, done) if ok]:
+                await self.db.zrem(key, *finished)
+        if earliest := await self.db.zrange(key, 0, 0, withscores=True):
+            return earliest[0][1] / 1000
+        return None
+
+    async def __execute(self, bot: Bot, job: dict) -> bool:
+        """Returns ``False`` to retry the job once its lease expires."""
+        try:
+            if job['action'] == TimerAction.SEND:
+                await bot.send_message(chat_id=job['chat_id'],
+                                       text=job['text'])
+            elif job['action'] == TimerAction.DELETE:
+                with suppress(TelegramBadRequest):  # already deleted
+                    await bot.delete_message(chat_id=job['chat_id'],
+                                             message_id=job['message_id'])
+        except TelegramAPIError as exc:
+            LOGGER.warning('timer %s of bot %s dropped: %s',
+                           job, bot.id, exc)
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.error('timer %s of bot %s failed, will retry: %s',
+                         job, bot.id, exc)
+            return False
+        self.executed += 1
+        return True
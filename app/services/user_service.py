@@ -1,47 +1,131 @@
 from typing import Union
 
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 
-BANNED_KEY = 'banned:{bot_id}'
+from app.configuration.config_loader import CONFIG
+from app.services.ban_cache import (
+    BanCache,
+    BANNED_KEY,
+    BANNED_EVENTS_CHANNEL
+)
+
+# legacy one-key-per-link layout, read as a fallback only
 FORWARD_MESSAGE_KEY = 'input:{bot_id}:{forwarded_message_id}'
+# links are grouped into small hashes by forwarded message id, which
+# Redis keeps in its compact listpack encoding
+LINKS_KEY = 'links:{bot_id}:{bucket}'
+USERS_KEY = 'users:{bot_id}'
+# reverse index: forwarded message ids of a user, scored by the id
+HISTORY_KEY = 'history:{bot_id}:{user_id}'
+
+
+def get_links_key(bot_id: int, message_id: int) -> str:
+    return LINKS_KEY.format(
+        bot_id=bot_id,
+        bucket=int(message_id) // CONFIG.links.bucket_size
+    )
+
+
+def add_history(pipe: Pipeline, bot_id: int, user_id: int,
+                message_ids: list[int]) -> None:
+    """Queues adding forwarded message ids to the user's history index,
+    trimmed to the newest ``Links.history_size`` ids.
+    """
+    if not CONFIG.links.history_size or not message_ids:
+        return
+    query = HISTORY_KEY.format(bot_id=bot_id, user_id=user_id)
+    pipe.zadd(query, {message_id: message_id for message_id in message_ids})
+    pipe.zremrangebyrank(query, 0, -CONFIG.links.history_size - 1)
+    pipe.expire(query, CONFIG.links.retention)
 
 
 class UserService:
 
-    def __init__(self, db: Redis):
+    def __init__(self, db: Redis, ban_cache: Union[None, BanCache] = None):
         self.db = db
+        self.ban_cache = ban_cache
 
     async def get_user(
             self, bot_id: int,
             forward_message_id: int
     ) -> Union[None, int]:
-        query = FORWARD_MESSAGE_KEY.format(
-            bot_id=bot_id,
-            forwarded_message_id=forward_message_id
+        user_id = await self.db.hget(
+            get_links_key(bot_id, forward_message_id),
+            forward_message_id
         )
-        user_id = await self.db.get(query)
+        if not user_id:
+            user_id = await self.db.get(FORWARD_MESSAGE_KEY.format(
+                bot_id=bot_id,
+                forwarded_message_id=forward_message_id
+            ))
         return int(user_id) if user_id else None
 
     async def get_banned_users(self, bot_id: int) -> list[int]:
         query = BANNED_KEY.format(bot_id=bot_id)
-        return list(map(int, await self.db.lrange(query, 0, -1)))
+        return list(map(int, await self.db.smembers(query)))
 
     async def ban_user(self, bot_id: int, user_id: int) -> int:
-        query = BANNED_KEY.format(bot_id=bot_id)
-        return await self.db.lpush(query, user_id)
+        return await self.__change_ban(bot_id, user_id, banned=True)
 
     async def unban_user(self, bot_id: int, user_id: int) -> int:
-        query = BANNED_KEY.format(bot_id=bot_id)
-        return await self.db.lrem(query, 1, str(user_id))
+        return await self.__change_ban(bot_id, user_id, banned=False)
 
     async def is_banned(self, bot_id: int, user_id: int) -> bool:
-        banned_users = await self.get_banned_users(bot_id)
-        return int(user_id) in banned_users
+        if self.ban_cache:
+            if (banned := self.ban_cache.get(bot_id)) is not None:
+                return int(user_id) in banned
+        query = BANNED_KEY.format(bot_id=bot_id)
+        return bool(await self.db.sismember(query, user_id))
+
+    async def add_user(self, bot_id: int, user_id: int) -> None:
+        query = USERS_KEY.format(bot_id=bot_id)
+        await self.db.zadd(query, {user_id: user_id})
 
     async def set_user_link(self, bot_id: int, message_id: int,
                             user_id: int) -> None:
-        query = FORWARD_MESSAGE_KEY.format(
-            bot_id=bot_id,
-            forwarded_message_id=message_id
-        )
-        await self.db.append(query, user_id)
+        await self.set_user_links(bot_id, [message_id], user_id)
+
+    async def set_user_links(self, bot_id: int, message_ids: list[int],
+                             user_id: int) -> None:
+        buckets: dict[str, dict[int, int]] = {}
+        for message_id in message_ids:
+            query = get_links_key(bot_id, message_id)
+            buckets.setdefault(query, {})[message_id] = user_id
+        async with self.db.pipeline(transaction=False) as pipe:
+            for query, links in buckets.items():
+                pipe.hset(query, mapping=links)
+                pipe.expire(query, CONFIG.links.retention)
+            pipe.zadd(USERS_KEY.format(bot_id=bot_id), {user_id: user_id})
+            add_history(pipe, bot_id, user_id, message_ids)
+            await pipe.execute()
+
+    async def get_user_history(self, bot_id: int, user_id: int) -> list[int]:
+        """Indexed forwarded message ids of the user, newest first."""
+        query = HISTORY_KEY.format(bot_id=bot_id, user_id=user_id)
+        return list(map(int, await self.db.zrevrange(query, 0, -1)))
+
+    async def forget_user_history(self, bot_id: int, user_id: int,
+                                  message_ids: list[int]) -> None:
+        if message_ids:
+            query = HISTORY_KEY.format(bot_id=bot_id, user_id=user_id)
+            await self.db.zrem(query, *message_ids)
+
+    async def __change_ban(
+            self,
+            bot_id: int,
+            user_id: int,
+            banned: bool
+    ) -> int:
+        query = BANNED_KEY.format(bot_id=bot_id)
+        async with self.db.pipeline(transaction=True) as pipe:
+            if banned:
+                pipe.sadd(query, user_id)
+            else:
+                pipe.srem(query, user_id)
+            pipe.publish(
+                BANNED_EVENTS_CHANNEL,
+                BanCache.format_event(bot_id, user_id, banned)
+            )
+            changed, _ = await pipe.execute()
+        return changed
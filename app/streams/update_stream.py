@@ -0,0 +1,283 @@
+import asyncio
+import json
+import math
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.configuration.config_loader import Config
+from app.configuration.log import get_logger
+from app.db.database import RELEASE_LEASE_SCRIPT, RENEW_LEASE_SCRIPT
+
+LOGGER = get_logger(__name__)
+
+UPDATES_STREAM_KEY = 'updates:{bot_id}:{shard}'
+UPDATES_LEASE_KEY = 'updates:{bot_id}:{shard}:lease'
+# live consumers of all worker processes, scored by heartbeat expiry (ms)
+CONSUMERS_KEY = 'updates:consumers'
+CONSUMER_GROUP = 'workers'
+
+
+def get_update_chat_id(update: Update) -> int:
+    """Chat the update belongs to, used to keep per-chat order."""
+    event = update.event
+    if chat := getattr(event, 'chat', None):
+        return chat.id
+    if chat := getattr(getattr(event, 'message', None), 'chat', None):
+        return chat.id
+    if user := getattr(event, 'from_user', None):
+        return user.id
+    return update.update_id
+
+
+class StreamIngestMiddleware(BaseMiddleware):
+    """Outer update middleware of the ``ingest`` role.
+
+    Instead of handling updates it appends them to the Redis Stream of
+    their shard (``chat_id % shards``), leaving processing to workers.
+    It runs ahead of the FSM context middleware, so ingesting an update
+    costs one ``XADD`` and no state read or chat lock.
+    """
+
+    async def __call__(
+            self, handler: Callable[
+                [TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        bot: Bot = data['bot']
+        shard = get_update_chat_id(event) % self.settings.shards
+        await self.db.xadd(
+            UPDATES_STREAM_KEY.format(bot_id=bot.id, shard=shard),
+            {'update': event.model_dump_json(by_alias=True,
+                                             exclude_none=True)},
+            maxlen=self.settings.maxlen,
+            approximate=True
+        )
+
+    def __init__(self, db: Redis, settings: Config.Queue):
+        self.db = db
+        self.settings = settings
+
+
+class StreamWorker:
+    """Consumes update streams of the ``worker`` role.
+
+    Each consumer holds leases on its share of the shards; a shard is
+    read by one consumer at a time and its entries are fed to the
+    dispatcher in order, so updates of one chat never overtake each
+    other while different shards are processed in parallel. Entries
+    left pending for ``lease`` ms by a previous owner (one that crashed
+    or lost the lease) are reclaimed and replayed; an owner that lost
+    its lease stops at the next entry, so none is handled twice.
+
+    Consumers of all processes announce themselves in ``CONSUMERS_KEY``
+    with a heartbeat. The share is ``shards_per_consumer`` if set, else
+    all shards divided by the live consumers; a consumer above its share
+    (after another process joined) releases shards for others to take.
+    """
+
+    def __init__(
+            self,
+            db: Redis,
+            dp: Dispatcher,
+            bots: list[Bot],
+            settings: Config.Queue
+    ):
+        self.db = db
+        self.dp = dp
+        self.bots = {bot.id: bot for bot in bots}
+        self.settings = settings
+        self.processed = 0
+        self.released = 0
+        self.__shares: dict[str, int] = {}
+        self.__renew_lease = db.register_script(RENEW_LEASE_SCRIPT)
+        self.__release_lease = db.register_script(RELEASE_LEASE_SCRIPT)
+        self.__shards = [
+            (bot_id, shard)
+            for bot_id in self.bots
+            for shard in range(settings.shards)
+        ]
+
+    async def run(self) -> None:
+        await self.__create_groups()
+        prefix = f'{socket.gethostname()}-{os.getpid()}'
+        names = [f'{prefix}-{i}' for i in range(self.settings.workers)]
+        for name in names:
+            await self.__heartbeat(name)
+        LOGGER.info('start %d stream consumers, up to %d shards each',
+                    self.settings.workers, self.__shares[names[0]])
+        try:
+            await asyncio.gather(*(self.__consume(name) for name in names))
+        finally:
+            await self.db.zrem(CONSUMERS_KEY, *names)
+
+    async def __heartbeat(self, name: str) -> None:
+        """Keeps the consumer registered and updates its share."""
+        seconds, microseconds = await self.db.time()
+        now = seconds * 1000 + microseconds // 1000
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.zadd(CONSUMERS_KEY, {name: now + self.settings.lease})
+            pipe.zremrangebyscore(CONSUMERS_KEY, '-inf', now)
+            pipe.zcard(CONSUMERS_KEY)
+            *_, consumers = await pipe.execute()
+        self.__shares[name] = self.settings.shards_per_consumer or \
+            math.ceil(len(self.__shards) / max(consumers, 1))
+
+    async def __create_groups(self) -> None:
+        for bot_id, shard in self.__shards:
+            try:
+                await self.db.xgroup_create(
+                    UPDATES_STREAM_KEY.format(bot_id=bot_id, shard=shard),
+                    CONSUMER_GROUP, id='0', mkstream=True
+                )
+            except ResponseError as exc:
+                if 'BUSYGROUP' not in str(exc):
+                    raise
+
+    async def __consume(self, name: str) -> None:
+        owned: dict[str, int] = {}  # stream key -> bot id
+        keeper = asyncio.create_task(self.__keep_leases(name, owned))
+        reclaimed_at = asyncio.get_running_loop().time()
+        try:
+            while True:
+                share = self.__shares[name]
+                await self.__release_shards(name, owned, share)
+                await self.__acquire_shards(name, owned, share)
+                if not owned:
+                    await asyncio.sleep(self.settings.lease / 3000)
+                    continue
+                now = asyncio.get_running_loop().time()
+                if now - reclaimed_at >= self.settings.lease / 1000:
+                    # entries of an owner that died soon after reading
+                    # become idle long enough only after the take-over
+                    reclaimed_at = now
+                    for stream in list(owned):
+                        await self.__reclaim(name, stream, owned)
+                entries = await self.db.xreadgroup(
+                    CONSUMER_GROUP, name,
+                    {stream: '>' for stream in owned},
+                    count=self.settings.batch,
+                    block=self.settings.block
+                )
+                await asyncio.gather(*(
+                    self.__process(name, stream.decode(), messages, owned)
+                    for stream, messages in entries or []
+                ))
+        finally:
+            keeper.cancel()
+            for stream in owned:
+                await self.__release_lease(keys=[f'{stream}:lease'],
+                                           args=[name])
+
+    async def __acquire_shards(
+            self,
+            name: str,
+            owned: dict[str, int],
+            per_consumer: int
+    ) -> None:
+        for bot_id, shard in self.__shards:
+            if len(owned) >= per_consumer:
+                return
+            stream = UPDATES_STREAM_KEY.format(bot_id=bot_id, shard=shard)
+            if stream in owned:
+                continue
+            if await self.db.set(
+                    UPDATES_LEASE_KEY.format(bot_id=bot_id, shard=shard),
+                    name, nx=True, px=self.settings.lease
+            ):
+                owned[stream] = bot_id
+                await self.__reclaim(name, stream, owned)
+
+    async def __release_shards(
+            self,
+            name: str,
+            owned: dict[str, int],
+            share: int
+    ) -> None:
+        """Gives up shards above the share; their entries read so far are
+        already acked, so the next owner starts where this one stopped.
+        """
+        while len(owned) > share:
+            stream = next(reversed(owned))
+            del owned[stream]
+            await self.__release_lease(keys=[f'{stream}:lease'],
+                                       args=[name])
+            self.released += 1
+            LOGGER.info('%s released %s', name, stream)
+
+    async def __keep_leases(self, name: str, owned: dict[str, int]) -> None:
+        while True:
+            await asyncio.sleep(self.settings.lease / 3000)
+            await self.__heartbeat(name)
+            for stream in list(owned):
+                if not await self.__renew_lease(
+                        keys=[f'{stream}:lease'],
+                        args=[name, self.settings.lease]
+                ):
+                    LOGGER.warning('lease of %s lost', stream)
+                    owned.pop(stream, None)
+
+    async def __reclaim(
+            self,
+            name: str,
+            stream: str,
+            owned: dict[str, int]
+    ) -> None:
+        """Takes over entries a previous owner read but never acked.
+
+        Only entries idle for a whole lease are taken: an owner that lost
+        its lease may still be handling the newer ones, and stops before
+        the next.
+        """
+        start_id = '0-0'
+        while stream in owned:
+            start_id, messages, *_ = await self.db.xautoclaim(
+                stream, CONSUMER_GROUP, name,
+                min_idle_time=self.settings.lease, start_id=start_id,
+                count=self.settings.batch
+            )
+            if messages:
+                LOGGER.info('reclaimed %d pending updates of %s',
+                            len(messages), stream)
+                await self.__process(name, stream, messages, owned)
+            if start_id in (b'0-0', '0-0'):
+                return
+
+    async def __process(
+            self,
+            name: str,
+            stream: str,
+            messages: list[tuple[bytes, dict[bytes, bytes]]],
+            owned: dict[str, int]
+    ) -> None:
+        """Feeds the entries to the dispatcher while the stream is owned;
+        the rest stay pending for the next owner.
+        """
+        bot = self.bots[int(stream.split(':')[1])]
+        for message_id, fields in messages:
+            if stream not in owned:
+                LOGGER.warning('%s stopped %s after losing the lease',
+                               name, stream)
+                return
+            if not fields:  # deleted by trimming while pending
+                await self.db.xack(stream, CONSUMER_GROUP, message_id)
+                continue
+            try:
+                await self.dp.feed_raw_update(
+                    bot=bot,
+                    update=json.loads(fields[b'update'])
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.exception('update %s of %s failed: %s',
+                                 message_id, stream, exc)
+            finally:
+                await self.db.xack(stream, CONSUMER_GROUP, message_id)
+                self.processed += 1
+        LOGGER.debug('%s processed %d updates of %s',
+                     name, len(messages), stream)
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import (
+    BaseRequestHandler,
+    setup_application
+)
+from aiohttp import web
+
+from app.configuration.config_loader import CONFIG, get_env
+from app.configuration.log import get_logger
+
+LOGGER = get_logger(__name__)
+
+BOT_PATH_KEY = 'bot_path'
+
+
+class MultiBotRequestHandler(BaseRequestHandler):
+    """Serves updates of all bots from a single aiohttp route.
+
+    Every bot gets its own secret path segment and secret token, both
+    derived from ``WEBHOOK_SECRET`` (or a random per-run secret), so
+    a request is routed by path and authenticated by the
+    ``X-Telegram-Bot-Api-Secret-Token`` header. Updates are acknowledged
+    immediately and processed in background tasks.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bots: list[Bot], secret: str):
+        super().__init__(dispatcher=dispatcher, handle_in_background=True)
+        self.secret = secret.encode()
+        self.bots = {self.get_bot_path(bot): bot for bot in bots}
+
+    def __derive(self, purpose: str, bot: Bot) -> str:
+        return hmac.new(
+            self.secret,
+            f'{purpose}:{bot.id}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+
+    def get_bot_path(self, bot: Bot) -> str:
+        return self.__derive('path', bot)[:32]
+
+    def get_secret_token(self, bot: Bot) -> str:
+        return self.__derive('token', bot)
+
+    def register(self, app: web.Application, /, path: str, **kwargs) -> None:
+        super().register(app, path=f'{path}/{{{BOT_PATH_KEY}}}', **kwargs)
+
+    async def resolve_bot(self, request: web.Request) -> Bot:
+        if bot := self.bots.get(request.match_info[BOT_PATH_KEY]):
+            return bot
+        raise web.HTTPNotFound()
+
+    def verify_secret(self, telegram_secret_token: str, bot: Bot) -> bool:
+        return secrets.compare_digest(
+            telegram_secret_token,
+            self.get_secret_token(bot)
+        )
+
+    async def close(self) -> None:
+        for bot in self.bots.values():
+            await bot.session.close()
+
+    async def set_webhooks(self, allowed_updates: list[str]) -> None:
+        await asyncio.gather(*(
+            bot.set_webhook(
+                url=f'{CONFIG.webhook.base_url}{CONFIG.webhook.path}/{path}',
+                secret_token=self.get_secret_token(bot),
+                allowed_updates=allowed_updates,
+                max_connections=CONFIG.webhook.max_connections,
+                drop_pending_updates=CONFIG.updates.drop_pending
+            ) for path, bot in self.bots.items()
+        ))
+
+
+async def start_webhook(dp: Dispatcher, bots: list[Bot]) -> None:
+    """Runs one aiohttp server for all bots until cancelled."""
+    if not CONFIG.webhook.base_url:
+        raise RuntimeError('Please, provide Webhook.base_url in default.yaml')
+
+    secret = get_env('WEBHOOK_SECRET')
+    if not secret:
+        LOGGER.warning('WEBHOOK_SECRET is not set, using a random secret')
+        secret = secrets.token_hex(32)
+
+    app = web.Application()
+    request_handler = MultiBotRequestHandler(dp, bots, secret)
+    request_handler.register(app, path=CONFIG.webhook.path)
+    setup_application(app, dp, bots=bots)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    if CONFIG.webhook.unix_socket:
+        site = web.UnixSite(runner, CONFIG.webhook.unix_socket)
+    else:
+        site = web.TCPSite(runner, CONFIG.webhook.host, CONFIG.webhook.port)
+    try:
+        await site.start()
+        await request_handler.set_webhooks(dp.resolve_used_update_types())
+        LOGGER.info('webhook server for %d bots listening on %s',
+                    len(bots), site.name)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
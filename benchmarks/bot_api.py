@@ -0,0 +1,96 @@
+"""Stub Telegram Bot API server for offline benchmarks.
+
+Answers every method with a minimal valid result after a fixed latency
+and counts the calls, so handlers run unchanged against it.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Union
+
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from app.keyboards.keyboard import FrozenMarkupSession
+
+ADMIN_ID = 1
+HOST = '127.0.0.1'
+
+MESSAGE_METHODS = frozenset({
+    'forwardmessage', 'editmessagetext', 'editmessagecaption',
+    'editmessagereplymarkup', 'editmessagemedia'
+})
+MESSAGE_ID_LIST_METHODS = frozenset({'forwardmessages', 'copymessages'})
+
+
+class StubBotApi:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        # reported as the admins of every chat
+        self.admins = frozenset({ADMIN_ID})
+        self.calls: Counter[str] = Counter()
+        self.url: Union[None, str] = None
+        self.__message_ids = itertools.count(1_000_000)
+        self.__runner: Union[None, web.AppRunner] = None
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    def session(self) -> FrozenMarkupSession:
+        """A bot session sending requests to this server."""
+        return FrozenMarkupSession(api=TelegramAPIServer.from_base(self.url))
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, HOST, 0).start()
+        port = self.__runner.addresses[0][1]
+        self.url = f'http://{HOST}:{port}'
+
+    async def stop(self) -> None:
+        if self.__runner:
+            await self.__runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        bot_id = int(request.match_info['token'].split(':')[0])
+        data = await request.post()
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({
+            'ok': True,
+            'result': self.__result(bot_id, method.lower(), data)
+        })
+
+    def __result(self, bot_id: int, method: str, data: Any) -> Any:
+        if method == 'getme':
+            return {'id': bot_id, 'is_bot': True, 'first_name': 'bench',
+                    'username': f'bench_{bot_id}_bot'}
+        if method == 'getchatadministrators':
+            return [{'status': 'creator', 'is_anonymous': False,
+                     'user': {'id': admin_id, 'is_bot': False,
+                              'first_name': 'admin'}}
+                    for admin_id in self.admins]
+        if method == 'getchatmember':
+            return {'status': 'member',
+                    'user': {'id': int(data['user_id']), 'is_bot': False,
+                             'first_name': 'user'}}
+        if method in MESSAGE_ID_LIST_METHODS:
+            return [{'message_id': next(self.__message_ids)}
+                    for _ in json.loads(data['message_ids'])]
+        if method == 'copymessage':
+            return {'message_id': next(self.__message_ids)}
+        if method in MESSAGE_METHODS or method.startswith('send') \
+                and method != 'sendchataction':
+            chat_id = int(data['chat_id'])
+            return {'message_id': next(self.__message_ids),
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id,
+                             'type': 'private' if chat_id > 0
+                             else 'supergroup'}}
+        return True
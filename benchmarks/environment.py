@@ -0,0 +1,127 @@
+"""The app's dispatcher running offline, shared by the benchmarks.
+
+Bots of ``default.yaml`` talk to a ``StubBotApi`` and keep their data in
+a disposable Redis database.
+"""
+import argparse
+import logging
+import statistics
+import sys
+from typing import Iterable, Union
+
+from aiogram import Bot, Dispatcher
+from redis.asyncio.client import Redis
+
+from app.configuration.bot_data import BotDataRegistry
+from app.configuration.config_loader import CONFIG
+from app.configuration.log import LOG_PIPELINE
+from app.handlers.filters.filter import ADMIN_ROSTER
+from app.loader import build_dispatcher, create_bot
+from app.middlewares.outbound import OUTBOUND_SCHEDULER
+from app.services.newsletter_service import NewsletterService
+from app.services.timer_service import TimerService
+from app.services.user_service import UserService
+from benchmarks.bot_api import ADMIN_ID, StubBotApi
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--concurrency', type=int, default=100,
+                        help='updates processed at once')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='ms the stub Bot API takes per call')
+    parser.add_argument('--redis', default='redis://127.0.0.1:6379/15',
+                        help='Redis URL flushed before every run, '
+                             'or "fake"')
+    parser.add_argument('--pacing', action='store_true',
+                        help='keep the outbound rate limiter')
+    parser.add_argument('--max-p99', type=float, default=0,
+                        help='exit with 1 if a run p99 exceeds it, ms')
+    parser.add_argument('--verbose', action='store_true',
+                        help='print calls per Bot API method')
+
+
+def connect(url: str) -> Redis:
+    if url == 'fake':
+        try:
+            import fakeredis  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            sys.exit('fakeredis is not installed, pass --redis URL')
+        return fakeredis.FakeAsyncRedis()
+    db = Redis.from_url(url)
+    kwargs = db.connection_pool.connection_kwargs
+    if (kwargs.get('host'), kwargs.get('port'), kwargs.get('db', 0)) == \
+            (CONFIG.redis.host, CONFIG.redis.port, CONFIG.redis.db):
+        sys.exit('refusing to flush the database of default.yaml, '
+                 'pass another --redis URL')
+    return db
+
+
+class BenchEnvironment:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.db = connect(args.redis)
+        self.stub = StubBotApi(latency=args.latency / 1000)
+        self.bots: dict[int, Bot] = {}
+        self.dp: Union[None, Dispatcher] = None
+
+    async def start(self, admins: Iterable[int] = (ADMIN_ID,)) -> None:
+        """``admins`` are the members the stub reports as admins of
+        every admin chat.
+        """
+        LOG_PIPELINE.configure(path=CONFIG.logging.path,
+                               level=logging.WARNING)
+        self.stub.admins = frozenset(admins)
+        await self.stub.start()
+        self.bots = {
+            b_data.id: create_bot(f'{b_data.id}:bench',
+                                  session=self.stub.session(),
+                                  pacing=self.args.pacing)
+            for b_data in CONFIG.bots.values() if b_data.enabled
+        }
+        if not self.bots:
+            sys.exit('no enabled bots in default.yaml')
+        OUTBOUND_SCHEDULER.bind(CONFIG.outbound)
+        ADMIN_ROSTER.bind(ttl=CONFIG.admin_cache.ttl)
+        bot_data = BotDataRegistry(CONFIG.bot_data)
+        bot_data.load()
+        self.dp = await build_dispatcher(
+            db=self.db,
+            bots=list(self.bots.values()),
+            bot_data=bot_data,
+            user_service=UserService(self.db),
+            newsletter_service=NewsletterService(self.db, CONFIG.newsletter),
+            timer_service=TimerService(self.db, CONFIG.timers)
+        )
+
+    async def stop(self) -> None:
+        for bot in self.bots.values():
+            await bot.session.close()
+        await self.stub.stop()
+        await self.db.aclose()
+
+    def summarize(self, latencies: list[float], elapsed: float) -> dict:
+        quantiles = statistics.quantiles(latencies, n=100) \
+            if len(latencies) > 1 else latencies * 99
+        return {
+            'updates': len(latencies),
+            'throughput': len(latencies) / elapsed,
+            'p50': quantiles[49] * 1000,
+            'p99': quantiles[98] * 1000,
+            'api_calls': sum(self.stub.calls.values()) / len(latencies),
+            'methods': dict(self.stub.calls)
+        }
+
+    @staticmethod
+    def print_header() -> None:
+        print(f'{"run":<14} {"updates":>8} {"upd/s":>9} {"p50 ms":>8} '
+              f'{"p99 ms":>8} {"api/upd":>8}')
+
+    def report(self, name: str, result: dict) -> bool:
+        """Prints the result; returns ``False`` if p99 is over the limit."""
+        print(f'{name:<14} {result["updates"]:>8} '
+              f'{result["throughput"]:>9.1f} {result["p50"]:>8.2f} '
+              f'{result["p99"]:>8.2f} {result["api_calls"]:>8.2f}')
+        if self.args.verbose:
+            for method, calls in sorted(result['methods'].items()):
+                print(f'    {method:<24} {calls:>8}')
+        return not self.args.max_p99 or result['p99'] <= self.args.max_p99
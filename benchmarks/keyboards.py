@@ -0,0 +1,86 @@
+"""Micro-benchmark of cached keyboard builders.
+
+Usage::
+
+    python -m benchmarks.keyboards [--renders N]
+
+Renders every keyboard of the admin menus ``N`` times with the caches of
+``app.keyboards.keyboard`` bypassed and then through them, and reports
+time and memory allocated per render. A render builds the keyboard and
+the request form of a message carrying it, so the cached variant also
+reuses the pre-serialised markup.
+"""
+import argparse
+import timeit
+import tracemalloc
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+
+from app.keyboards import keyboard
+
+SESSION = keyboard.FrozenMarkupSession()
+BOT = Bot('1:bench', session=SESSION)
+
+BUILDERS = (
+    (keyboard.get_admin_start_keyboard, ()),
+    (keyboard.get_channel_keyboard, ()),
+    (keyboard.get_accept_keyboard, ()),
+    (keyboard.get_bot_link_keyboard, ('channel_helper_bot',)),
+    (keyboard.get_newsletter_keyboard, ('running',)),
+    (keyboard.get_newsletter_keyboard, ('paused',)),
+)
+
+
+def send(markup: keyboard.FrozenInlineKeyboardMarkup) -> None:
+    SESSION.build_form_data(BOT, SendMessage(chat_id=1, text='menu',
+                                             reply_markup=markup))
+
+
+def render_uncached() -> None:
+    for builder, args in BUILDERS:
+        keyboard.pack_admin_callback.cache_clear()
+        send(builder.__wrapped__(*args))
+
+
+def render_cached() -> None:
+    for builder, args in BUILDERS:
+        send(builder(*args))
+
+
+def allocated(render: Callable[[], None], renders: int) -> float:
+    """Bytes allocated per render, including memory freed right away."""
+    tracemalloc.start()
+    try:
+        render()  # warm up
+        total = 0
+        for _ in range(renders):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            render()
+            total += tracemalloc.get_traced_memory()[1] - before
+        return total / renders
+    finally:
+        tracemalloc.stop()
+
+
+def main(args: argparse.Namespace) -> None:
+    results = {}
+    for title, render in (('uncached', render_uncached),
+                          ('cached', render_cached)):
+        seconds = timeit.timeit(render, number=args.renders)
+        results[title] = (seconds / args.renders * 1e6,
+                          allocated(render, min(args.renders, 1000)))
+        print(f'{title:<9} {results[title][0]:8.1f} us/render  '
+              f'{results[title][1]:9.0f} B peak allocated/render')
+    (slow, slow_bytes), (fast, fast_bytes) = results.values()
+    print(f'cache is {slow / fast:.0f}x faster and allocates '
+          f'{slow_bytes - fast_bytes:.0f} B less per render')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--renders', type=int, default=10000,
+                        help='renders of all menu keyboards per variant')
+    main(parser.parse_args())
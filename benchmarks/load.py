@@ -0,0 +1,209 @@
+"""Offline load test of the update handlers.
+
+Usage::
+
+    python -m benchmarks.load [--scenario NAME ...] [--updates N]
+        [--concurrency N] [--latency MS] [--redis URL] [--pacing]
+        [--max-p99 MS]
+
+Starts a stub Bot API server answering after ``--latency`` ms, builds
+the app's dispatcher for the bots of ``default.yaml`` against it and
+feeds synthetic updates through ``Dispatcher.feed_update``. Reports
+throughput, p50/p99 latency of ``feed_update`` and Bot API calls per
+update for each scenario.
+
+The Redis database given by ``--redis`` is flushed before every scenario,
+never point it at live data; ``--redis fake`` runs an in-process
+fakeredis if it is installed. Album handlers run after their receive
+window, their time is not part of the latency but their calls are
+counted.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from typing import Callable, Iterator
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from app.configuration.config_loader import CONFIG
+from app.halpers.tasks import BACKGROUND_TASKS
+from app.services.user_service import UserService
+from benchmarks.bot_api import ADMIN_ID
+from benchmarks.environment import BenchEnvironment, add_arguments
+
+ALBUM_SIZE = 3
+ALBUM_WINDOW = 1.5  # sec, the media group receive timeout and a margin
+FIRST_USER_ID = 10 ** 9
+# forwarded message ids linked to users before the admin scenarios
+SEEDED_MESSAGES = 1000
+PHOTO = [{'file_id': 'photo', 'file_unique_id': 'photo',
+          'width': 1, 'height': 1}]
+
+
+class UpdateFactory:
+    """Builds updates of the bench's users and the admin chats."""
+
+    def __init__(self, users: int) -> None:
+        self.users = users
+        self.__ids = itertools.count(1)
+
+    def user_message(self) -> Update:
+        user_id = FIRST_USER_ID + random.randrange(self.users)
+        return self.__update({
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'},
+            'text': 'hello'
+        })
+
+    def album(self) -> list[Update]:
+        user_id = FIRST_USER_ID + random.randrange(self.users)
+        group_id = f'album{next(self.__ids)}'
+        return [self.__update({
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'},
+            'media_group_id': group_id,
+            'photo': PHOTO
+        }) for _ in range(ALBUM_SIZE)]
+
+    def admin_reply(self, bot: Bot, text: str = 'answer') -> Update:
+        settings = CONFIG.bots[bot.id]
+        chat = {'id': settings.admin_chat_id, 'type': 'supergroup'}
+        return self.__update({
+            'chat': chat,
+            'from': {'id': ADMIN_ID, 'is_bot': False, 'first_name': 'admin'},
+            'message_thread_id': settings.thread_id,
+            'text': text,
+            'reply_to_message': {
+                'message_id': random.randint(1, SEEDED_MESSAGES),
+                'date': int(time.time()),
+                'chat': chat,
+                'forward_date': int(time.time()),
+                'text': 'question'
+            }
+        })
+
+    def __update(self, message: dict) -> Update:
+        update_id = next(self.__ids)
+        return Update.model_validate({'update_id': update_id, 'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            **message
+        }})
+
+
+def scenario_user_messages(factory: UpdateFactory,
+                           _: Bot) -> list[Update]:
+    return [factory.user_message()]
+
+
+def scenario_admin_replies(factory: UpdateFactory,
+                           bot: Bot) -> list[Update]:
+    return [factory.admin_reply(bot)]
+
+
+def scenario_albums(factory: UpdateFactory, _: Bot) -> list[Update]:
+    return factory.album()
+
+
+def scenario_ban(factory: UpdateFactory, bot: Bot) -> list[Update]:
+    return [factory.admin_reply(bot, random.choice(('/ban', '/unban')))]
+
+
+def scenario_mix(factory: UpdateFactory, bot: Bot) -> list[Update]:
+    return random.choices(
+        (scenario_user_messages, scenario_admin_replies, scenario_albums,
+         scenario_ban),
+        weights=(70, 20, 5, 5)
+    )[0](factory, bot)
+
+
+SCENARIOS: dict[str, Callable[[UpdateFactory, Bot], list[Update]]] = {
+    'user_messages': scenario_user_messages,
+    'admin_replies': scenario_admin_replies,
+    'albums': scenario_albums,
+    'ban': scenario_ban,
+    'mix': scenario_mix
+}
+
+
+def generate(
+        scenario: str,
+        factory: UpdateFactory,
+        bots: list[Bot],
+        count: int
+) -> Iterator[tuple[Bot, Update]]:
+    produced = 0
+    for bot in itertools.cycle(bots):
+        for update in SCENARIOS[scenario](factory, bot):
+            yield bot, update
+            produced += 1
+        if produced >= count:
+            return
+
+
+async def seed(user_service: UserService, bots: list[Bot],
+               users: int) -> None:
+    for bot in bots:
+        for message_id in range(1, SEEDED_MESSAGES + 1):
+            await user_service.set_user_link(
+                bot.id, message_id, FIRST_USER_ID + message_id % users)
+
+
+async def run_scenario(
+        scenario: str,
+        bench: BenchEnvironment,
+        args: argparse.Namespace
+) -> dict:
+    bots = list(bench.bots.values())
+    await bench.db.flushdb()
+    await seed(UserService(bench.db), bots, args.users)
+    updates = list(generate(scenario, UpdateFactory(args.users), bots,
+                            args.updates))
+    bench.stub.reset()
+    latencies = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def feed(bot: Bot, update: Update) -> None:
+        async with slots:
+            started_at = time.perf_counter()
+            await bench.dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(feed(bot, update) for bot, update in updates))
+    await BACKGROUND_TASKS.drain()
+    elapsed = time.perf_counter() - started_at
+    if any(update.message.media_group_id for _, update in updates):
+        await asyncio.sleep(ALBUM_WINDOW)
+        await BACKGROUND_TASKS.drain()
+    return bench.summarize(latencies, elapsed)
+
+
+async def main(args: argparse.Namespace) -> int:
+    bench = BenchEnvironment(args)
+    await bench.start()
+    passed = True
+    bench.print_header()
+    try:
+        for scenario in args.scenario:
+            result = await run_scenario(scenario, bench, args)
+            passed = bench.report(scenario, result) and passed
+    finally:
+        await bench.stop()
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS), help='scenarios to run')
+    parser.add_argument('--updates', type=int, default=2000,
+                        help='updates per scenario')
+    parser.add_argument('--users', type=int, default=500,
+                        help='distinct users sending messages')
+    add_arguments(parser)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,136 @@
+"""Replays captured updates through the app's dispatcher.
+
+Usage::
+
+    python -m benchmarks.replay CAPTURE [--speed X] [--concurrency N]
+        [--latency MS] [--redis URL] [--pacing] [--max-p99 MS]
+
+``CAPTURE`` is a file or a directory written by the ``Capture`` section
+of ``default.yaml``. Updates are fed with their original spacing
+divided by ``--speed`` (1 - as recorded, 10 - ten times faster, 0 - as
+fast as ``--concurrency`` allows) to the bots of ``default.yaml`` running
+against a stub Bot API, and the same figures as ``benchmarks.load`` are
+reported, plus how far the replay fell behind the recorded schedule.
+
+Users who wrote in an admin chat are reported as its admins and every
+forwarded message an admin replies to is linked to a placeholder user,
+so replies take the same handlers as in production.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from app.capture.capture import read_capture
+from app.configuration.config_loader import CONFIG
+from app.halpers.tasks import BACKGROUND_TASKS
+from app.services.user_service import UserService
+from benchmarks.environment import BenchEnvironment, add_arguments
+
+ALBUM_WINDOW = 1.5  # sec, the media group receive timeout and a margin
+REPLAY_USER_ID = 10 ** 9
+
+
+def scan(path: str) -> tuple[set[int], dict[int, set[int]]]:
+    """Admins of the admin chats and forwarded messages they reply to,
+    by bot.
+    """
+    admin_chats = {b_data.admin_chat_id: b_data.id
+                   for b_data in CONFIG.bots.values()}
+    admins, replied = set(), {}
+    for record in read_capture(path):
+        message = record['update'].get('message') or {}
+        bot_id = admin_chats.get(message.get('chat', {}).get('id'))
+        if bot_id != record['bot']:
+            continue
+        if 'from' in message:
+            admins.add(message['from']['id'])
+        if reply := message.get('reply_to_message'):
+            replied.setdefault(bot_id, set()).add(reply['message_id'])
+    return admins, replied
+
+
+async def replay(bench: BenchEnvironment, args: argparse.Namespace) -> dict:
+    latencies = []
+    lag = 0.0
+    skipped = 0
+    slots = asyncio.Semaphore(args.concurrency) if not args.speed else None
+    tasks = set()
+
+    async def feed(bot: Bot, update: Update) -> None:
+        started_at = time.perf_counter()
+        await bench.dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - started_at)
+
+    async def feed_limited(bot: Bot, update: Update) -> None:
+        try:
+            await feed(bot, update)
+        finally:
+            slots.release()
+
+    first_time = None
+    started_at = time.perf_counter()
+    for record in read_capture(args.capture):
+        if not (bot := bench.bots.get(record['bot'])):
+            skipped += 1
+            continue
+        update = Update.model_validate(record['update'])
+        if slots:
+            await slots.acquire()
+            task = asyncio.create_task(feed_limited(bot, update))
+        else:
+            first_time = first_time or record['time']
+            due = started_at + (record['time'] - first_time) / args.speed
+            if (delay := due - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            lag = max(lag, -delay)
+            task = asyncio.create_task(feed(bot, update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    await BACKGROUND_TASKS.drain()
+    elapsed = time.perf_counter() - started_at
+    # albums are handled once their receive window closes
+    await asyncio.sleep(ALBUM_WINDOW)
+    await BACKGROUND_TASKS.drain()
+
+    if skipped:
+        print(f'{skipped} updates of bots not in default.yaml skipped')
+    if not latencies:
+        sys.exit('no updates to replay')
+    return {**bench.summarize(latencies, elapsed), 'lag': lag * 1000}
+
+
+async def main(args: argparse.Namespace) -> int:
+    admins, replied = scan(args.capture)
+    bench = BenchEnvironment(args)
+    await bench.start(admins=admins)
+    try:
+        await bench.db.flushdb()
+        user_service = UserService(bench.db)
+        for bot_id, message_ids in replied.items():
+            await user_service.set_user_links(bot_id, list(message_ids),
+                                              REPLAY_USER_ID)
+        bench.stub.reset()
+        result = await replay(bench, args)
+        bench.print_header()
+        passed = bench.report(f'x{args.speed}' if args.speed else 'max',
+                              result)
+        if args.speed:
+            print(f'fell behind the recorded schedule by at most '
+                  f'{result["lag"]:.1f} ms')
+    finally:
+        await bench.stop()
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('capture', help='capture file or directory')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='replay speed factor, 0 - as fast as possible')
+    add_arguments(parser)
+    sys.exit(asyncio.run(main(parser.parse_args())))
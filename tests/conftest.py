@@ -0,0 +1,23 @@
+import asyncio
+import inspect
+from typing import Union
+
+import fakeredis
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> Union[None, bool]:
+    """Runs ``async def`` tests in a fresh event loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name]
+              for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**kwargs))
+    return True
+
+
+@pytest.fixture
+def db() -> fakeredis.FakeAsyncRedis:
+    """An empty in-memory Redis with Lua scripting."""
+    return fakeredis.FakeAsyncRedis()
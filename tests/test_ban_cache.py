@@ -0,0 +1,49 @@
+import asyncio
+
+from app.services.ban_cache import BANNED_EVENTS_CHANNEL, BANNED_KEY, BanCache
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+async def test_warm_loads_sets(db):
+    await db.sadd(BANNED_KEY.format(bot_id=1), 10, 11)
+    cache = BanCache(db, [1, 2])
+    assert cache.get(1) is None
+    await cache.warm()
+    assert cache.get(1) == {10, 11}
+    assert cache.get(2) == set()
+
+
+async def test_apply_event(db):
+    cache = BanCache(db, [1])
+    await cache.warm()
+    cache.apply_event(BanCache.format_event(1, 10, True).encode())
+    cache.apply_event(BanCache.format_event(1, 11, True))
+    cache.apply_event(BanCache.format_event(1, 11, False))
+    assert cache.get(1) == {10}
+
+
+async def test_apply_event_of_unknown_bot_is_ignored(db):
+    cache = BanCache(db, [1])
+    await cache.warm()
+    cache.apply_event(BanCache.format_event(2, 10, True))
+    assert cache.get(2) is None
+
+
+async def test_listen_applies_published_events(db):
+    cache = BanCache(db, [1])
+    listener = asyncio.create_task(cache.listen())
+    try:
+        await wait_for(lambda: cache.get(1) is not None)
+        await db.publish(BANNED_EVENTS_CHANNEL,
+                         BanCache.format_event(1, 10, True))
+        await wait_for(lambda: cache.get(1) == {10})
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+    assert cache.get(1) is None
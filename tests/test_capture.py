@@ -0,0 +1,61 @@
+from app.capture.capture import HASH_PREFIX, FieldHasher
+
+FIELDS = ['id', 'text', 'latitude']
+
+
+def test_strings_are_hashed_stably():
+    hasher = FieldHasher(FIELDS, b'salt')
+    assert hasher.hash('hello') == hasher.hash('hello')
+    assert hasher.hash('hello').startswith(HASH_PREFIX)
+    assert hasher.hash('hello') != hasher.hash('hello!')
+    assert hasher.hash('hello') != FieldHasher(FIELDS, b'other').hash('hello')
+
+
+def test_leading_command_is_kept():
+    hasher = FieldHasher(FIELDS, b'salt')
+    assert hasher.hash('/start') == '/start'
+    command, rest = hasher.hash('/ban 12345').split(' ')
+    assert command == '/ban'
+    assert rest == hasher.digest('12345')
+
+
+def test_ids_keep_type_and_sign():
+    hasher = FieldHasher(FIELDS, b'salt')
+    user_id, chat_id = hasher.hash(12345), hasher.hash(-10012345)
+    assert isinstance(user_id, int) and user_id > 0 and user_id != 12345
+    assert isinstance(chat_id, int) and chat_id < 0
+    assert hasher.hash(12345) == user_id
+
+
+def test_kept_ids_are_not_hashed():
+    hasher = FieldHasher(FIELDS, b'salt', kept_ids=[-1001])
+    assert hasher.hash(-1001) == -1001
+    assert hasher.hash(True) is True
+
+
+def test_other_values():
+    hasher = FieldHasher(FIELDS, b'salt')
+    latitude = hasher.hash(55.75)
+    assert isinstance(latitude, float) and latitude != 55.75
+    assert hasher.hash(b'raw') is None
+    assert hasher.hash(None) is None
+
+
+def test_apply_hashes_nested_fields():
+    hasher = FieldHasher(FIELDS, b'salt', kept_ids=[-1001])
+    update = {
+        'update_id': 7,
+        'message': {
+            'message_id': 8,
+            'chat': {'id': -1001, 'type': 'supergroup'},
+            'from': {'id': 42, 'is_bot': False},
+            'text': 'secret',
+            'location': {'latitude': 55.75}
+        }
+    }
+    message = hasher.apply(update)['message']
+    assert message['message_id'] == 8
+    assert message['chat'] == {'id': -1001, 'type': 'supergroup'}
+    assert message['from'] == {'id': hasher.hash(42), 'is_bot': False}
+    assert message['text'] == hasher.hash('secret')
+    assert message['location']['latitude'] != 55.75
@@ -0,0 +1,37 @@
+from app.db.database import RELEASE_LEASE_SCRIPT, RENEW_LEASE_SCRIPT
+
+LEASE_KEY = 'lease'
+
+
+async def test_renew_by_owner(db):
+    renew = db.register_script(RENEW_LEASE_SCRIPT)
+    await db.set(LEASE_KEY, 'owner', px=1000)
+    assert await renew(keys=[LEASE_KEY], args=['owner', 60000]) == 1
+    assert await db.pttl(LEASE_KEY) > 1000
+
+
+async def test_renew_by_other_is_refused(db):
+    renew = db.register_script(RENEW_LEASE_SCRIPT)
+    await db.set(LEASE_KEY, 'owner', px=1000)
+    assert await renew(keys=[LEASE_KEY], args=['other', 60000]) == 0
+    assert await db.pttl(LEASE_KEY) <= 1000
+
+
+async def test_renew_of_lost_lease_is_refused(db):
+    renew = db.register_script(RENEW_LEASE_SCRIPT)
+    assert await renew(keys=[LEASE_KEY], args=['owner', 60000]) == 0
+    assert await db.exists(LEASE_KEY) == 0
+
+
+async def test_release_by_owner(db):
+    release = db.register_script(RELEASE_LEASE_SCRIPT)
+    await db.set(LEASE_KEY, 'owner', px=1000)
+    assert await release(keys=[LEASE_KEY], args=['owner']) == 1
+    assert await db.exists(LEASE_KEY) == 0
+
+
+async def test_release_by_other_keeps_lease(db):
+    release = db.register_script(RELEASE_LEASE_SCRIPT)
+    await db.set(LEASE_KEY, 'owner', px=1000)
+    assert await release(keys=[LEASE_KEY], args=['other']) == 0
+    assert await db.get(LEASE_KEY) == b'owner'
@@ -0,0 +1,44 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.configuration.config_loader import Config
+from app.db.isolation import DistributedEventIsolation
+
+
+def key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+async def test_idle_locks_are_evicted(db):
+    isolation = DistributedEventIsolation(
+        db, Config.Isolation(backend='local', max_local_locks=2))
+    for chat_id in range(4):
+        async with isolation.lock(key(chat_id)):
+            pass
+    assert isolation.stats['local_locks'] == 2
+    assert isolation.evicted == 2
+
+
+async def test_key_is_serialised_when_table_is_full_of_busy_locks(db):
+    isolation = DistributedEventIsolation(
+        db, Config.Isolation(backend='local', max_local_locks=2))
+    release = asyncio.Event()
+    events = []
+
+    async def hold(chat_id: int) -> None:
+        async with isolation.lock(key(chat_id)):
+            events.append(('enter', chat_id))
+            await release.wait()
+            events.append(('exit', chat_id))
+
+    holders = [asyncio.create_task(hold(chat_id)) for chat_id in (1, 2)]
+    await asyncio.sleep(0)
+    contenders = [asyncio.create_task(hold(3)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    # the second update of chat 3 waits on the lock of the first one
+    assert events.count(('enter', 3)) == 1
+    release.set()
+    await asyncio.gather(*holders, *contenders)
+    chat_events = [event for event in events if event[1] == 3]
+    assert chat_events == [('enter', 3), ('exit', 3)] * 2
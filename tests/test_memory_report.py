@@ -0,0 +1,38 @@
+import pytest
+
+from app.configuration.config_loader import CONFIG, Config
+from app.db.memory_report import build_audience, build_history, migrate
+from app.services.user_service import USERS_KEY, UserService
+
+BOT_ID = 1
+
+
+@pytest.fixture(autouse=True)
+def links_settings(monkeypatch):
+    # set on the proxy, so the test needs no default.yaml
+    monkeypatch.setitem(vars(CONFIG), 'links', Config.Links())
+
+
+async def test_migrate_moves_only_links(db):
+    await db.set(f'input:{BOT_ID}:5', 42)
+    await db.set(f'input:{BOT_ID}:x', 7)
+    assert await migrate(db, BOT_ID) == 1
+    assert await UserService(db).get_user(BOT_ID, 5) == 42
+    assert await db.exists(f'input:{BOT_ID}:5') == 0
+    assert await db.exists(f'input:{BOT_ID}:x') == 1
+
+
+async def test_build_history_of_both_layouts(db):
+    await db.set(f'input:{BOT_ID}:5', 42)
+    await db.hset(f'links:{BOT_ID}:0', mapping={'6': 42, '7': 43})
+    assert await build_history(db, BOT_ID) == 3
+    assert await UserService(db).get_user_history(BOT_ID, 42) == [6, 5]
+
+
+async def test_build_audience_of_both_layouts(db):
+    await db.set(f'input:{BOT_ID}:5', 42)
+    await db.hset(f'links:{BOT_ID}:0', mapping={'6': 42, '7': 43})
+    await db.zadd(USERS_KEY.format(bot_id=BOT_ID), {44: 44})
+    assert await build_audience(db, BOT_ID) == 3
+    assert await db.zrange(USERS_KEY.format(bot_id=BOT_ID), 0, -1) == [
+        b'42', b'43', b'44']
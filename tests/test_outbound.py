@@ -0,0 +1,44 @@
+import asyncio
+
+from app.middlewares.outbound import (
+    Priority,
+    PriorityTokenBucket,
+    TokenBucket
+)
+
+
+def test_take_until_empty():
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert 0 < bucket.take() <= 1
+
+
+def test_give_back_is_capped():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.take() == 0
+    bucket.give_back()
+    bucket.give_back()
+    assert bucket.take() == 0
+    assert bucket.take() > 0
+
+
+def test_block():
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.block(10)
+    assert 9 < bucket.take() <= 10
+    bucket.block(1)  # a shorter block doesn't cut the longer one
+    assert bucket.take() > 9
+
+
+async def test_waiters_are_served_by_priority():
+    bucket = PriorityTokenBucket(rate=100, capacity=1)
+    await bucket.acquire(Priority.NORMAL)
+    served = []
+
+    async def acquire(priority: Priority) -> None:
+        await bucket.acquire(priority)
+        served.append(priority)
+
+    await asyncio.gather(acquire(Priority.BULK), acquire(Priority.NORMAL),
+                         acquire(Priority.HIGH))
+    assert served == [Priority.HIGH, Priority.NORMAL, Priority.BULK]
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from app.db.storage import HashRedisStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+@pytest.fixture
+def storage(db) -> HashRedisStorage:
+    return HashRedisStorage(redis=db)
+
+
+async def test_set_and_get_data(storage):
+    await storage.set_data(KEY, {'text': 'hi', 'ids': [1, 2]})
+    assert await storage.get_data(KEY) == {'text': 'hi', 'ids': [1, 2]}
+    await storage.set_data(KEY, {'other': None})
+    assert await storage.get_data(KEY) == {'other': None}
+
+
+async def test_set_empty_data_clears(storage):
+    await storage.set_data(KEY, {'text': 'hi'})
+    await storage.set_data(KEY, {})
+    assert await storage.get_data(KEY) == {}
+
+
+async def test_update_data_keeps_other_fields(storage):
+    await storage.set_data(KEY, {'a': 1, 'b': 2})
+    assert await storage.update_data(KEY, {'b': 3, 'c': 4}) == {
+        'a': 1, 'b': 3, 'c': 4}
+
+
+async def test_get_and_set_value(storage):
+    assert await storage.get_value(KEY, 'a', 'default') == 'default'
+    await storage.set_value(KEY, 'a', {'nested': True})
+    assert await storage.get_value(KEY, 'a') == {'nested': True}
+
+
+async def test_append_value(storage):
+    assert await storage.append_value(KEY, 'ids', [1]) == [1]
+    assert await storage.append_value(KEY, 'ids', [2, 3]) == [1, 2, 3]
+    await storage.set_value(KEY, 'ids', [])
+    assert await storage.append_value(KEY, 'ids', [4]) == [4]
+    assert await storage.get_value(KEY, 'ids') == [4]
+
+
+async def test_append_value_sets_ttl(db):
+    storage = HashRedisStorage(redis=db, data_ttl=60)
+    await storage.append_value(KEY, 'ids', [1])
+    assert 0 < await db.ttl(storage.key_builder.build(KEY, 'fields')) <= 60
+
+
+async def test_legacy_data_is_moved_into_hash(db, storage):
+    legacy_key = storage.key_builder.build(KEY, 'data')
+    await db.set(legacy_key, json.dumps({'a': 1, 'b': 2}))
+    await storage.set_value(KEY, 'b', 3)
+    assert await storage.get_data(KEY) == {'a': 1, 'b': 3}
+    assert await db.exists(legacy_key) == 0
+    assert await storage.get_data(KEY) == {'a': 1, 'b': 3}
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.configuration.config_loader import Config
+from app.services.timer_service import TIMERS_KEY, TimerService
+
+BOT_ID = 1
+KEY = TIMERS_KEY.format(bot_id=BOT_ID)
+
+
+class StubBot:
+    id = BOT_ID
+
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.sent: list[tuple[int, str]] = []
+        self.deleted: list[tuple[int, int]] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        if self.fail:
+            raise ConnectionError('network is down')
+        self.sent.append((chat_id, text))
+
+    async def delete_message(self, chat_id: int, message_id: int) -> None:
+        self.deleted.append((chat_id, message_id))
+
+
+@pytest.fixture
+def settings() -> Config.Timers:
+    return Config.Timers(batch=2, lease=30)
+
+
+async def test_due_jobs_run_once(db, settings):
+    service = TimerService(db, settings)
+    bot = StubBot()
+    for number in range(3):
+        await service.send_later(BOT_ID, 10, f'text {number}', 0)
+    await service.delete_later(BOT_ID, 10, 5, 0)
+    assert await service.run_due(bot) is None
+    assert sorted(bot.sent) == [(10, 'text 0'), (10, 'text 1'),
+                                (10, 'text 2')]
+    assert bot.deleted == [(10, 5)]
+    assert service.executed == 4
+    assert await db.zcard(KEY) == 0
+    await service.run_due(bot)
+    assert service.executed == 4
+
+
+async def test_future_jobs_wait(db, settings):
+    service = TimerService(db, settings)
+    bot = StubBot()
+    await service.send_later(BOT_ID, 10, 'later', 60)
+    next_due = await service.run_due(bot)
+    assert bot.sent == []
+    assert time.time() + 59 < next_due <= time.time() + 60
+
+
+async def test_failed_job_stays_claimed_for_lease(db, settings):
+    service = TimerService(db, settings)
+    await service.send_later(BOT_ID, 10, 'text', 0)
+    next_due = await service.run_due(StubBot(fail=True))
+    assert next_due > time.time() + settings.lease - 1
+    # another runner doesn't see the claimed job before the lease ends
+    other_bot = StubBot()
+    await TimerService(db, settings).run_due(other_bot)
+    assert other_bot.sent == []
+    job, _ = (await db.zrange(KEY, 0, 0, withscores=True))[0]
+    await db.zadd(KEY, {job: int(time.time() * 1000)})
+    await TimerService(db, settings).run_due(other_bot)
+    assert other_bot.sent == [(10, 'text')]
+    assert json.loads(job)['action'] == 'send'
+
+
+async def test_run_wakes_up_for_new_jobs(db):
+    service = TimerService(db, Config.Timers(poll_interval=60))
+    bot = StubBot()
+    runner = asyncio.create_task(service.run([bot]))
+    try:
+        await asyncio.sleep(0.05)
+        await service.send_later(BOT_ID, 10, 'soon', 0.05)
+        for _ in range(100):
+            if bot.sent:
+                break
+            await asyncio.sleep(0.01)
+        assert bot.sent == [(10, 'soon')]
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
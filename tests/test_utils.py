@@ -0,0 +1,16 @@
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from app.db.storage import CachedFSMContext, HashRedisStorage
+from app.halpers.utils import add_ui_messages
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=3)
+
+
+@pytest.mark.parametrize('context_class', [FSMContext, CachedFSMContext])
+async def test_add_ui_messages(db, context_class):
+    state = context_class(storage=HashRedisStorage(redis=db), key=KEY)
+    await add_ui_messages([1], state)
+    await add_ui_messages([2, 3], state)
+    assert await state.get_value('ui_messages') == [1, 2, 3]